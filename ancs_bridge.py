@@ -5,25 +5,67 @@ from __future__ import annotations
 import asyncio
 import base64
 import dataclasses
+import email.utils
+import functools
 import hashlib
 import hmac
 import json
 import os
-import re
+import sys
 import threading
 import time
 import urllib.parse
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Tuple
-
-import requests
-from bleak import BleakClient, BleakScanner
-
-try:
-    from win_toast import show_toast
-except Exception:
-    show_toast = None  # type: ignore
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+from ancs_parser import (
+    CMD_GET_APP_ATTRIBUTES,
+    CMD_GET_NOTIFICATION_ATTRIBUTES,
+    DataSourceParser,
+    DataSourceResponse,
+)
+from app_names import APP_ATTR_DISPLAY_NAME, AppNameCache, app_attributes_request
+from blocker import KeywordBlocker
+from codes import CodeExtractor
+from control_point import ControlPointQueue
+from dedup import DedupIndex, fingerprint
+from delivery import Batcher, DeliveryPipeline, RateLimited, RetryPolicy, is_transient_error
+from http_pool import POOL as HTTP_POOL
+from metrics import BridgeMetrics, MetricsServer
+from outbox import Outbox
+from routing import Router
+
+# Optional / heavy modules load on first use, so the GUI paints (and the headless
+# service starts) without bleak, requests, smtplib or winsdk in memory:
+# bleak on the first scan or start_all, the toast helper once toasts are enabled,
+# requests with the first HTTP delivery (http_pool), smtplib with the first email.
+if TYPE_CHECKING:
+    from bleak import BleakClient, BleakScanner
+else:
+    BleakClient = BleakScanner = None
+
+show_toast = None
+_toast_loaded = False
+
+
+def _load_bleak():
+    global BleakClient, BleakScanner
+    if BleakClient is None or BleakScanner is None:
+        import bleak
+        BleakClient = BleakClient or bleak.BleakClient
+        BleakScanner = BleakScanner or bleak.BleakScanner
+
+
+def _load_toast():
+    global show_toast, _toast_loaded
+    if not _toast_loaded:
+        _toast_loaded = True
+        try:
+            from win_toast import show_toast as fn
+            show_toast = fn
+        except Exception:
+            show_toast = None
 
 
 # -----------------------------
@@ -40,8 +82,14 @@ ATTR_APP_IDENTIFIER = 0
 ATTR_TITLE = 1
 ATTR_SUBTITLE = 2
 ATTR_MESSAGE = 3
+ATTR_MESSAGE_SIZE = 4
 ATTR_DATE = 5
 
+ATTR_MAX_LEN = 65535  # attribute lengths are u16 on the wire
+
+# a link that stayed up this long resets the reconnect backoff
+STABLE_LINK_SECONDS = 30.0
+
 
 # -----------------------------
 # Config location (portable-first, AppData fallback)
@@ -57,7 +105,18 @@ def _base_dir() -> Path:
 
 
 def _is_writable_dir(p: Path) -> bool:
+    """
+    Whether config.json in p can be saved. Both checks really open a file, because
+    os.access only looks at the read-only flag on Windows and ignores ACLs. An
+    existing config is opened for append and closed untouched. Only when there is
+    no config yet is a probe file created and deleted.
+    """
+    cfg = p / "config.json"
     try:
+        if cfg.exists():
+            with open(cfg, "a", encoding="utf-8"):
+                pass
+            return True
         p.mkdir(parents=True, exist_ok=True)
         test = p / ".write_test"
         test.write_text("ok", encoding="utf-8")
@@ -88,12 +147,15 @@ def get_config_path() -> str:
     return str(cfg_dir / "config.json")
 
 
-def load_config(path: str) -> "BridgeConfig":
+def load_config(path: str, strict: bool = False) -> "BridgeConfig":
+    """Read config.json; a missing or malformed file gives the defaults unless strict."""
     try:
         with open(path, "r", encoding="utf-8") as f:
             d = json.load(f)
         return BridgeConfig(**d)
     except Exception:
+        if strict:
+            raise
         return BridgeConfig()
 
 
@@ -115,11 +177,34 @@ class BridgeConfig:
     # devices
     ble_addresses: List[str] = field(default_factory=list)
     auto_pick_heart_rate: bool = False
+    # run every device session on one manager-owned event loop (False = a thread + loop per device)
+    ble_shared_loop: bool = True
+    # reconnect backoff after a lost/failed link: doubles up to the cap, with jitter
+    reconnect_base_seconds: float = 1.5
+    reconnect_max_seconds: float = 60.0
+    # ANCS Control Point: attribute requests awaiting a response at once
+    ancs_cp_inflight: int = 2
+    ancs_cp_timeout_seconds: float = 5.0
+    # use write-without-response when the Control Point advertises it
+    ancs_cp_write_without_response: bool = True
+    # attribute lengths of the first (preview) fetch; codes are taken from it
+    ancs_title_len: int = 64
+    ancs_msg_preview_len: int = 256
+    # when the preview was cut off, fetch the whole message and send it as a follow-up
+    ancs_fetch_full_message: bool = True
+    ancs_msg_full_len: int = 4096
+    # per app (bundle ID or "prefix*"): full-message length, 0 = never fetch
+    ancs_msg_full_len_apps: Dict[str, int] = field(default_factory=dict)
+    # resolve bundle IDs to display names (GetAppAttributes), cached in app_names.json
+    app_names_enabled: bool = True
+    app_names_max: int = 512
 
     # telegram
     enable_telegram: bool = True
     telegram_bot_token: str = ""
     telegram_chat_id: str = ""
+    telegram_coalesce_ms: int = 1000  # 0 = send every notification on its own
+    telegram_coalesce_max: int = 20
 
     # email
     enable_email: bool = False
@@ -129,6 +214,9 @@ class BridgeConfig:
     smtp_pass: str = ""
     email_to: str = ""
     email_from: str = ""
+    email_digest_enabled: bool = False
+    email_digest_seconds: int = 300
+    email_digest_max_items: int = 50
 
     # dingtalk
     enable_dingtalk: bool = False
@@ -143,6 +231,37 @@ class BridgeConfig:
 
     # behavior
     dedup_seconds: int = 8
+    dedup_max_entries: int = 4096
+    # one phone reached through several adapters/addresses: match on ANCS UID +
+    # app + content instead of the BLE address, so only the first copy is sent
+    dedup_cross_adapter: bool = False
+
+    # outbox (undelivered messages survive restarts / network loss)
+    outbox_enabled: bool = True
+    outbox_max_age_hours: int = 24
+    outbox_retry_seconds: int = 30
+
+    # retries / circuit breaker (per destination, transient failures only)
+    retry_max: int = 3
+    retry_base_seconds: float = 1.0
+    retry_max_delay_seconds: float = 30.0
+    breaker_threshold: int = 5
+    breaker_cooldown_seconds: int = 30
+
+    # rate limits (messages per minute, 0 = no pacing; server backoff hints always apply)
+    telegram_rate_per_min: int = 20
+    dingtalk_rate_per_min: int = 20
+    gotify_rate_per_min: int = 0
+    email_rate_per_min: int = 0
+    rate_burst: int = 5
+
+    # delivery (per-destination queues)
+    delivery_queue_size: int = 200
+    delivery_deadline_seconds: int = 60
+
+    # http keep-alive pool (telegram / dingtalk / gotify)
+    http_pool_size: int = 4
+    http_idle_seconds: int = 90
 
     # filter
     block_keywords: List[str] = field(default_factory=list)
@@ -151,9 +270,17 @@ class BridgeConfig:
     # code
     enable_code_highlight: bool = True
     code_regex: str = r"\b\d{4,8}\b"
+    # extra named patterns (name -> regex); "default" is code_regex, see codes.BUILTIN_PATTERNS
+    code_patterns: Dict[str, str] = field(default_factory=dict)
+    # bundle ID (or "prefix*") -> comma-separated pattern names, e.g. {"com.icbc.*": "digits6"}
+    code_app_rules: Dict[str, str] = field(default_factory=dict)
     code_send_separately: bool = True
     code_separate_prefix: str = "🔑 Code"
 
+    # routing: ordered rules, first match wins; unmatched notifications go to
+    # every enabled destination (see routing.Router for the rule format)
+    routes: List[Dict] = field(default_factory=list)
+
     # history
     history_limit: int = 300
 
@@ -162,43 +289,143 @@ class BridgeConfig:
 
     # misc
     show_battery_in_message: bool = True
+
+    # metrics: Prometheus text format on http://<bind>:<port>/metrics (off by default)
+    metrics_enabled: bool = False
+    metrics_bind: str = "127.0.0.1"
+    metrics_port: int = 9465
+    # battery level comes from GATT notifications when the phone offers them;
+    # otherwise it is re-read in the background at this interval
+    battery_refresh_seconds: int = 60
     enable_windows_toast: bool = True
 
 
 # -----------------------------
 # Destinations
 # -----------------------------
+def _retry_after(r, default: float = 5.0) -> Optional[float]:
+    """
+    Server-side backoff hint for a throttled response, or None if not throttled.
+    Understands Telegram's parameters.retry_after and the Retry-After header.
+    """
+    if r.status_code not in (429, 503):
+        return None
+    try:
+        ra = (r.json().get("parameters") or {}).get("retry_after")
+        if ra is not None:
+            return float(ra)
+    except Exception:
+        pass
+    h = (r.headers.get("Retry-After") or "").strip()
+    if h:
+        try:
+            return float(h)
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(h).timestamp() - time.time())
+            except Exception:
+                pass
+    return default
+
+
+def _raise_http_error(r):
+    """HTTPError carrying the response, so is_transient_error retries 5xx / 408 and not 4xx."""
+    import requests
+
+    raise requests.HTTPError(f"HTTP {r.status_code}: {r.text}", response=r)
+
+
 def send_telegram(token: str, chat_id: str, text: str, timeout: int = 10):
     if not token or not chat_id:
         raise ValueError("Missing Telegram token/chat_id")
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    r = requests.post(url, json={"chat_id": chat_id, "text": text}, timeout=timeout)
+    r = HTTP_POOL.post(url, json={"chat_id": chat_id, "text": text}, timeout=timeout)
+    ra = _retry_after(r)
+    if ra is not None:
+        raise RateLimited(ra, f"HTTP {r.status_code}: {r.text}")
     r.raise_for_status()
     j = r.json()
     if not j.get("ok", False):
         raise RuntimeError(str(j))
 
 
-def send_email(cfg: BridgeConfig, subject: str, body: str):
-    import smtplib
+TELEGRAM_MAX_LEN = 4096
+
+
+def _tg_len(s: str) -> int:
+    # Telegram counts UTF-16 code units (emoji / some CJK count twice)
+    return len(s.encode("utf-16-le")) // 2
+
+
+def _split_telegram_text(text: str, limit: int = TELEGRAM_MAX_LEN) -> List[str]:
+    """
+    Split text into parts that fit one sendMessage. Prefers blank lines (between
+    merged notifications), then line breaks, and only hard-cuts a single
+    over-long line.
+    """
+    if _tg_len(text) <= limit:
+        return [text]
+
+    # (joiner to previous piece, piece)
+    pieces: List[Tuple[str, str]] = []
+    for block in text.split("\n\n"):
+        if _tg_len(block) <= limit:
+            pieces.append(("\n\n", block))
+            continue
+        joiner = "\n\n"
+        for line in block.split("\n"):
+            while _tg_len(line) > limit:
+                cut = limit
+                while _tg_len(line[:cut]) > limit:
+                    cut -= 1
+                pieces.append((joiner, line[:cut]))
+                line = line[cut:]
+                joiner = ""
+            pieces.append((joiner, line))
+            joiner = "\n"
+
+    parts: List[str] = []
+    cur = ""
+    for joiner, p in pieces:
+        cand = f"{cur}{joiner}{p}" if cur else p
+        if cur and _tg_len(cand) > limit:
+            parts.append(cur)
+            cur = p
+        else:
+            cur = cand
+    if cur:
+        parts.append(cur)
+    return parts
+
+
+def send_telegram_long(token: str, chat_id: str, text: str, timeout: float = 10):
+    """send_telegram, split at Telegram's message length limit."""
+    for part in _split_telegram_text(text):
+        send_telegram(token, chat_id, part, timeout=timeout)
+
+
+def _telegram_specs(tag: str, text: str, ts: Optional[float] = None) -> List[dict]:
+    """One delivery spec per sendMessage, so a retry or the rate limit covers a single part."""
+    return [{"tag": tag, "kind": "telegram", "text": part, "ts": ts} for part in _split_telegram_text(text)]
+
+
+def send_email(cfg: BridgeConfig, subject: str, body: str, timeout: float = 10):
     from email.mime.text import MIMEText
+    from smtp_session import SESSIONS, split_recipients
 
     if not cfg.smtp_host or not cfg.smtp_user or not cfg.smtp_pass:
         raise ValueError("Missing SMTP settings")
-    if not cfg.email_to or not cfg.email_from:
+    recipients = split_recipients(cfg.email_to)
+    if not recipients or not cfg.email_from:
         raise ValueError("Missing email_to/email_from")
 
     msg = MIMEText(body, _charset="utf-8")
     msg["Subject"] = subject
     msg["From"] = cfg.email_from
-    msg["To"] = cfg.email_to
+    msg["To"] = ", ".join(recipients)
 
-    server = smtplib.SMTP(cfg.smtp_host, int(cfg.smtp_port), timeout=10)
-    server.ehlo()
-    server.starttls()
-    server.login(cfg.smtp_user, cfg.smtp_pass)
-    server.send_message(msg)
-    server.quit()
+    session = SESSIONS.get(cfg.smtp_host, int(cfg.smtp_port), cfg.smtp_user, cfg.smtp_pass)
+    session.send(msg, cfg.email_from, recipients, timeout=timeout)
 
 
 def _dingtalk_signed_url(webhook: str, secret: str) -> str:
@@ -226,16 +453,22 @@ def _dingtalk_signed_url(webhook: str, secret: str) -> str:
 def send_dingtalk_text(webhook: str, secret: str, text: str, timeout: int = 10):
     url = _dingtalk_signed_url(webhook, secret)
     data = {"msgtype": "text", "text": {"content": text}}
-    r = requests.post(url, json=data, timeout=timeout)
+    r = HTTP_POOL.post(url, json=data, timeout=timeout)
 
+    ra = _retry_after(r, default=60.0)
+    if ra is not None:
+        raise RateLimited(ra, f"HTTP {r.status_code}: {r.text}")
     if r.status_code != 200:
-        raise RuntimeError(f"HTTP {r.status_code}: {r.text}")
+        _raise_http_error(r)
 
     try:
         j = r.json()
     except Exception:
         raise RuntimeError(f"Bad response: {r.text}")
 
+    if j.get("errcode", 0) == 130101:
+        # "send too fast": robot is over its 20 messages/minute cap
+        raise RateLimited(60.0, str(j))
     if j.get("errcode", 0) != 0:
         raise RuntimeError(str(j))
 
@@ -253,10 +486,13 @@ def send_gotify(gotify_url: str, token: str, title: str, message: str, priority:
     url = f"{base}/message?token={token}"
     payload = {"title": title, "message": message, "priority": int(priority)}
 
-    r = requests.post(url, json=payload, timeout=timeout)
+    r = HTTP_POOL.post(url, json=payload, timeout=timeout)
+    ra = _retry_after(r)
+    if ra is not None:
+        raise RateLimited(ra, f"HTTP {r.status_code}: {r.text}")
     if r.status_code >= 400:
         # raise but keep body for debugging
-        raise RuntimeError(f"HTTP {r.status_code}: {r.text}")
+        _raise_http_error(r)
     # gotify normally returns JSON; ignore content here
 
 
@@ -267,31 +503,50 @@ def _now_ts() -> float:
     return time.time()
 
 
-def _contains_block_keyword(text: str, keywords: List[str], case_insensitive: bool) -> bool:
-    if not keywords:
-        return False
-    hay = text or ""
-    if case_insensitive:
-        hay = hay.lower()
-        kws = [k.lower() for k in keywords if k]
-    else:
-        kws = [k for k in keywords if k]
-    for k in kws:
-        if k and k in hay:
-            return True
-    return False
+_blocker_cache: Tuple[Optional[tuple], Optional[KeywordBlocker]] = (None, None)
 
 
-def _extract_codes(text: str, regex: str) -> List[str]:
-    try:
-        return re.findall(regex, text or "")
-    except Exception:
-        return []
+def _compile_blocker(keywords: List[str], case_insensitive: bool) -> KeywordBlocker:
+    """Compiled blocker for this keyword list; the last one is reused while unchanged."""
+    global _blocker_cache
+    key = (tuple(keywords or ()), bool(case_insensitive))
+    cached_key, cached = _blocker_cache
+    if cached is not None and cached_key == key:
+        return cached
+    blocker = KeywordBlocker(keywords or [], case_insensitive)
+    _blocker_cache = (key, blocker)
+    return blocker
+
+
+_codes_cache: Tuple[Optional[tuple], Optional[CodeExtractor]] = (None, None)
+
+
+def _compile_codes(cfg: BridgeConfig, log: Optional[Callable[[str], None]] = None) -> CodeExtractor:
+    """Compiled code rules for cfg; the last one is reused while unchanged."""
+    global _codes_cache
+    key = (
+        cfg.code_regex,
+        tuple(sorted((cfg.code_patterns or {}).items())),
+        tuple(sorted((cfg.code_app_rules or {}).items())),
+    )
+    cached_key, cached = _codes_cache
+    if cached is not None and cached_key == key:
+        return cached
+    extractor = CodeExtractor(cfg.code_regex, cfg.code_patterns, cfg.code_app_rules, log=log)
+    _codes_cache = (key, extractor)
+    return extractor
+
+
+def _app_label(payload: dict) -> str:
+    """'微信 (com.tencent.xin)' once the display name is known, else the bundle ID."""
+    app = payload.get("app") or ""
+    name = payload.get("app_name") or ""
+    return f"{name} ({app})" if name and name != app else app
 
 
 def _format_message(payload: dict, cfg: BridgeConfig) -> str:
     lines = []
-    lines.append("📲 iPhone 通知")
+    lines.append("📲 iPhone 通知 · 全文" if payload.get("full_message") else "📲 iPhone 通知")
     if payload.get("device"):
         lines.append(f"Device: {payload.get('device')}")
     if cfg.show_battery_in_message:
@@ -299,7 +554,7 @@ def _format_message(payload: dict, cfg: BridgeConfig) -> str:
         if isinstance(bat, int):
             lines.append(f"Battery: {bat}%")
     if payload.get("app"):
-        lines.append(f"App: {payload.get('app')}")
+        lines.append(f"App: {_app_label(payload)}")
     if payload.get("title"):
         lines.append(f"Title: {payload.get('title')}")
     if payload.get("msg"):
@@ -309,6 +564,45 @@ def _format_message(payload: dict, cfg: BridgeConfig) -> str:
     return "\n".join(lines)
 
 
+def _format_digest(payloads: List[dict], cfg: BridgeConfig) -> str:
+    """
+    One mail for many notifications: codes first, then grouped by device and app.
+    """
+    def hm(p: dict) -> str:
+        return time.strftime("%H:%M:%S", time.localtime(p.get("ts") or 0))
+
+    lines = []
+    first, last = payloads[0], payloads[-1]
+    lines.append(f"📲 iPhone 通知汇总 · {len(payloads)} ({hm(first)} – {hm(last)})")
+
+    code_rows = [p for p in payloads if p.get("codes")]
+    if code_rows:
+        lines.append("")
+        lines.append(f"{cfg.code_separate_prefix}:")
+        for p in code_rows:
+            src = " · ".join(x for x in (p.get("app_name") or p.get("app"), p.get("title")) if x)
+            lines.append(f"  {' '.join(p.get('codes') or [])}  ({hm(p)} {src})")
+
+    groups: Dict[str, Dict[str, List[dict]]] = {}
+    for p in payloads:
+        groups.setdefault(p.get("device") or "?", {}).setdefault(_app_label(p) or "?", []).append(p)
+
+    for device, apps in groups.items():
+        lines.append("")
+        head = f"== Device: {device}"
+        if cfg.show_battery_in_message:
+            bats = [p.get("battery") for p in payloads if p.get("device") == device and isinstance(p.get("battery"), int)]
+            if bats:
+                head += f" · Battery: {bats[-1]}%"
+        lines.append(head + " ==")
+        for app, items in apps.items():
+            lines.append(f"[{app}] ({len(items)})")
+            for p in items:
+                text = " | ".join(x for x in (p.get("title"), p.get("msg")) if x)
+                lines.append(f"  {hm(p)}  {text}")
+    return "\n".join(lines)
+
+
 # -----------------------------
 # ANCS Session
 # -----------------------------
@@ -319,19 +613,57 @@ class _ANCSSession:
         cfg: BridgeConfig,
         log: Callable[[str], None],
         on_payload: Callable[[dict], None],
+        accept: Optional[Callable[[str, int, str, str, str, str], bool]] = None,
+        app_names: Optional[AppNameCache] = None,
+        metrics: Optional[BridgeMetrics] = None,
     ):
         self.addr = addr
         self.cfg = cfg
         self.log = log
         self.on_payload = on_payload
+        self.accept = accept  # dedup gate: (device, uid, app, title, msg, date) -> first copy?
+        self.app_names = app_names  # shared by all sessions; None = show bundle IDs
+        self.metrics = metrics
+        self.blocker = _compile_blocker(cfg.block_keywords, cfg.block_case_insensitive)
+        self.codes = _compile_codes(cfg, log)
 
         self.client: Optional[BleakClient] = None
         self._stop = asyncio.Event()
-
-        self._ds_buf: bytearray = bytearray()
+        self._disconnected = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connected_at: Optional[float] = None
+        self._lost_at: Optional[float] = None  # when the link last went down (or first attempt started)
+        self.stats: Dict[str, object] = {
+            "connected": False,
+            "connects": 0,
+            "reconnects": 0,
+            "failed_attempts": 0,
+            "last_reconnect_s": None,
+            "max_reconnect_s": 0.0,
+            "total_reconnect_s": 0.0,
+        }
+
+        self._ds = DataSourceParser(
+            self._on_ds_response,
+            log=self._log_ds,
+        )
+        self.cp = ControlPointQueue(
+            self._write_cp,
+            self._ds,
+            max_inflight=cfg.ancs_cp_inflight,
+            timeout=cfg.ancs_cp_timeout_seconds,
+            log=self._log_ds,
+            on_rtt=(lambda s: metrics.cp_rtt.observe(s, device=addr)) if metrics else None,
+        )
+        self._cp_with_response = True
+        self._full_pending: Dict[int, dict] = {}  # uid -> forwarded preview awaiting its full message
         self._await_uid: Optional[int] = None
-        self._last_battery_read: float = 0.0
-        self._battery_cache: Optional[int] = None
+        self._battery_cache: Optional[int] = None  # kept current off the emit path
+        self._battery_notify = False
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
 
     async def stop(self):
         self._stop.set()
@@ -342,24 +674,93 @@ class _ANCSSession:
             pass
 
     async def run(self):
+        self._loop = asyncio.get_running_loop()
+        attempt = 0
         while not self._stop.is_set():
+            self.stats["connected"] = False
+            if self._lost_at is None:
+                self._lost_at = time.monotonic()
             try:
                 await self._connect_and_listen()
             except Exception as e:
+                self.stats["failed_attempts"] += 1
                 self.log(f"[{self.addr}] session error: {e}")
-            await asyncio.sleep(1.5)
+            if self._stop.is_set():
+                break
+
+            up = (time.monotonic() - self._connected_at) if self._connected_at else 0.0
+            self._connected_at = None
+            attempt = 1 if up >= STABLE_LINK_SECONDS else attempt + 1
+            policy = RetryPolicy(
+                base_seconds=max(0.1, float(self.cfg.reconnect_base_seconds or 1.5)),
+                max_delay_seconds=max(0.1, float(self.cfg.reconnect_max_seconds or 60.0)),
+            )
+            delay = policy.backoff(attempt)
+            self.log(f"[{self.addr}] reconnecting in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_disconnected(self, _client: BleakClient):
+        # bleak may call this from its own thread; the event belongs to our loop
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._disconnected.set)
+
+    def _mark_connected(self):
+        now = time.monotonic()
+        self._connected_at = now
+        self.stats["connected"] = True
+        self.stats["connects"] += 1
+        if self.stats["connects"] > 1 and self._lost_at is not None:
+            took = now - self._lost_at
+            self.stats["reconnects"] += 1
+            self.stats["last_reconnect_s"] = round(took, 2)
+            self.stats["max_reconnect_s"] = round(max(self.stats["max_reconnect_s"], took), 2)
+            self.stats["total_reconnect_s"] = round(self.stats["total_reconnect_s"] + took, 2)
+            if self.metrics is not None:
+                self.metrics.reconnects.inc(device=self.addr)
+        self._lost_at = None
 
     async def _connect_and_listen(self):
+        _load_bleak()
         self.log(f"[{self.addr}] connecting...")
-        async with BleakClient(self.addr) as client:
+        self._disconnected.clear()
+        async with BleakClient(self.addr, disconnected_callback=self._on_disconnected) as client:
             self.client = client
             self.log(f"[{self.addr}] connected={client.is_connected}")
+            self._mark_connected()
+            self._ds.clear()  # partial responses from a previous link are useless
+            self.cp.reset()
+            self._full_pending.clear()
+            self._cp_with_response = True
+            if self.cfg.ancs_cp_write_without_response:
+                try:
+                    char = client.services.get_characteristic(CTRL_PT)
+                    self._cp_with_response = "write-without-response" not in (char.properties if char else [])
+                except Exception:
+                    pass
 
-            await client.start_notify(NOTIF_SRC, self._on_notif_src)
             await client.start_notify(DATA_SRC, self._on_data_src)
+            await client.start_notify(NOTIF_SRC, self._on_notif_src)
+            cp_task = asyncio.create_task(self.cp.run())
+            battery_task = asyncio.create_task(self._watch_battery(client))
 
-            while client.is_connected and not self._stop.is_set():
-                await asyncio.sleep(0.25)
+            # sleep until the link drops or we are asked to stop; no polling
+            waiters = [asyncio.create_task(self._disconnected.wait()), asyncio.create_task(self._stop.wait())]
+            try:
+                if client.is_connected:
+                    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                cp_task.cancel()
+                battery_task.cancel()
+                for w in waiters:
+                    w.cancel()
+                self.stats["connected"] = False
+                if not self._stop.is_set():
+                    self._lost_at = time.monotonic()
+                    self.log(f"[{self.addr}] disconnected")
 
             try:
                 await client.stop_notify(NOTIF_SRC)
@@ -369,24 +770,40 @@ class _ANCSSession:
                 await client.stop_notify(DATA_SRC)
             except Exception:
                 pass
+            if self._battery_notify:
+                try:
+                    await client.stop_notify(BATTERY_LEVEL_CHAR)
+                except Exception:
+                    pass
 
     async def _read_battery(self) -> Optional[int]:
-        if self._battery_cache is not None and (_now_ts() - self._last_battery_read) < 5.0:
-            return self._battery_cache
         if not self.client or not self.client.is_connected:
             return self._battery_cache
         try:
             val = await self.client.read_gatt_char(BATTERY_LEVEL_CHAR)
-            if val and len(val) >= 1:
-                b = int(val[0])
-                if 0 <= b <= 100:
-                    self._battery_cache = b
-                    self._last_battery_read = _now_ts()
-                    return b
+            self._on_battery(0, val)
         except Exception:
-            return self._battery_cache
+            pass
         return self._battery_cache
 
+    def _on_battery(self, _sender: int, data: bytearray):
+        if data and len(data) >= 1 and 0 <= data[0] <= 100:
+            self._battery_cache = int(data[0])
+
+    async def _watch_battery(self, client: BleakClient):
+        """Subscribe to Battery Level if possible, else re-read it every battery_refresh_seconds."""
+        self._battery_notify = False
+        await self._read_battery()
+        try:
+            await client.start_notify(BATTERY_LEVEL_CHAR, self._on_battery)
+            self._battery_notify = True
+            return
+        except Exception:
+            pass
+        while client.is_connected:
+            await asyncio.sleep(max(5, int(self.cfg.battery_refresh_seconds or 60)))
+            await self._read_battery()
+
     def _on_notif_src(self, _sender: int, data: bytearray):
         if not data or len(data) < 8:
             return
@@ -395,93 +812,148 @@ class _ANCSSession:
         if event_id != 0:
             return
         self._await_uid = uid
-        self._ds_buf = bytearray()
-        asyncio.create_task(self._request_attributes(uid))
+        self.cp.submit(CMD_GET_NOTIFICATION_ATTRIBUTES, uid, self._attributes_request(uid), 5)
 
-    async def _request_attributes(self, uid: int):
-        if not self.client or not self.client.is_connected:
-            return
-        try:
-            title_len = 64
-            msg_len = 256
+    def _attributes_request(self, uid: int) -> bytes:
+        title_len = min(ATTR_MAX_LEN, max(1, int(self.cfg.ancs_title_len or 64)))
+        msg_len = min(ATTR_MAX_LEN, max(1, int(self.cfg.ancs_msg_preview_len or 256)))
 
-            payload = bytearray()
-            payload.append(0x00)
-            payload += uid.to_bytes(4, "little")
+        payload = bytearray()
+        payload.append(CMD_GET_NOTIFICATION_ATTRIBUTES)
+        payload += uid.to_bytes(4, "little")
 
-            payload.append(ATTR_APP_IDENTIFIER)
+        payload.append(ATTR_APP_IDENTIFIER)
 
-            payload.append(ATTR_TITLE)
-            payload += int(title_len).to_bytes(2, "little")
+        payload.append(ATTR_TITLE)
+        payload += int(title_len).to_bytes(2, "little")
 
-            payload.append(ATTR_MESSAGE)
-            payload += int(msg_len).to_bytes(2, "little")
+        payload.append(ATTR_MESSAGE)
+        payload += int(msg_len).to_bytes(2, "little")
 
-            payload.append(ATTR_DATE)
+        payload.append(ATTR_MESSAGE_SIZE)
+        payload.append(ATTR_DATE)
+        return bytes(payload)
 
-            await self.client.write_gatt_char(CTRL_PT, payload, response=True)
-            self.log(f"[{self.addr}] [CP] requested attributes for uid={uid}")
-        except Exception as e:
-            self.log(f"[{self.addr}] [CP] error: {e}")
+    def _full_message_len(self, app: str) -> int:
+        rules = self.cfg.ancs_msg_full_len_apps or {}
+        n = rules.get(app)
+        if n is None:
+            n = next((v for k, v in rules.items() if k.endswith("*") and app.startswith(k[:-1])),
+                     self.cfg.ancs_msg_full_len)
+        return min(ATTR_MAX_LEN, max(0, int(n or 0)))
+
+    def _maybe_fetch_full(self, uid: int, payload: dict, attrs: Dict[int, str]):
+        """Queue a message-only request when the preview stopped short of the whole body."""
+        if not self.cfg.ancs_fetch_full_message:
+            return
+        # all lengths here are UTF-8 bytes, the unit of the requested max length; the
+        # phone's MessageSize is only trusted to say "nothing more" (0 or not longer)
+        msg = payload.get("msg") or ""
+        got = len((attrs.get(ATTR_MESSAGE) or "").encode("utf-8"))
+        try:
+            size = int(attrs.get(ATTR_MESSAGE_SIZE) or 0)
+        except ValueError:
+            size = 0
+        if size <= len(msg):
+            return
+        preview_len = min(ATTR_MAX_LEN, max(1, int(self.cfg.ancs_msg_preview_len or 256)))
+        if got < preview_len - 3:  # the cut may fall up to 3 bytes short, inside a character
+            return
+        full_len = self._full_message_len(payload.get("app") or "")
+        if full_len <= got:
+            return
+        req = bytearray([CMD_GET_NOTIFICATION_ATTRIBUTES]) + uid.to_bytes(4, "little")
+        req.append(ATTR_MESSAGE)
+        req += full_len.to_bytes(2, "little")
+        if self.cp.submit(CMD_GET_NOTIFICATION_ATTRIBUTES, uid, bytes(req), 1):
+            self._full_pending[uid] = payload
+            while len(self._full_pending) > 256:
+                self._full_pending.pop(next(iter(self._full_pending)))
+
+    def _emit_full_message(self, preview: dict, msg: str):
+        if len(msg) <= len(preview.get("msg") or ""):
+            return
+        # a block keyword may only appear past the preview cut
+        app = preview.get("app") or ""
+        app_name = preview.get("app_name") or ""
+        app_text = f"{app}\n{app_name}" if app_name else app
+        if self.blocker.is_blocked(app_text, preview.get("title") or "", msg, preview.get("date") or ""):
+            self.log(f"[{self.addr}] [FILTER] blocked full message")
+            return
+        codes = preview.get("codes") or []
+        if self.cfg.enable_code_highlight:
+            codes = self.codes.extract(preview.get("app") or "", preview.get("title") or "", msg)
+        payload = dict(preview, ts=_now_ts(), msg=msg, codes=codes, full_message=True,
+                       codes_sent=list(preview.get("codes") or []))
+        self.on_payload(payload)
+
+    async def _write_cp(self, payload: bytes):
+        if not self.client or not self.client.is_connected:
+            raise RuntimeError("not connected")
+        await self.client.write_gatt_char(CTRL_PT, payload, response=self._cp_with_response)
 
     def _on_data_src(self, _sender: int, chunk: bytearray):
         if not chunk:
             return
-        self._ds_buf += chunk
-        self._try_parse_ds()
-
-    def _try_parse_ds(self):
-        while True:
-            if len(self._ds_buf) < 5:
+        self._ds.feed(chunk)
+        self.cp.on_data()
+
+    def _log_ds(self, msg: str):
+        self.log(f"[{self.addr}] {msg}")
+
+    def _on_ds_response(self, resp: DataSourceResponse):
+        self.cp.on_response(resp)
+        if resp.command_id == CMD_GET_NOTIFICATION_ATTRIBUTES:
+            if ATTR_APP_IDENTIFIER not in resp.attrs:
+                # a message-only full fetch; a second answer to a re-sent one finds no preview
+                preview = self._full_pending.pop(resp.uid, None)
+                if preview is not None and ATTR_MESSAGE in resp.attrs:
+                    self._emit_full_message(preview, resp.attrs[ATTR_MESSAGE])
                 return
-
-            cmd_id = self._ds_buf[0]
-            uid = int.from_bytes(self._ds_buf[1:5], "little", signed=False)
-            if cmd_id != 0x00:
-                self._ds_buf = bytearray()
-                return
-
-            pos = 5
-            attrs: Dict[int, str] = {}
-            while True:
-                if len(self._ds_buf) < pos + 3:
-                    return
-                attr_id = self._ds_buf[pos]
-                attr_len = int.from_bytes(self._ds_buf[pos + 1: pos + 3], "little", signed=False)
-                pos += 3
-                if len(self._ds_buf) < pos + attr_len:
-                    return
-                raw = bytes(self._ds_buf[pos: pos + attr_len])
-                pos += attr_len
-                try:
-                    attrs[attr_id] = raw.decode("utf-8", errors="ignore")
-                except Exception:
-                    attrs[attr_id] = ""
-
-                if pos >= len(self._ds_buf):
-                    break
-
-            self._ds_buf = bytearray()
-            asyncio.create_task(self._emit_notification(uid, attrs))
-            return
-
-    async def _emit_notification(self, uid: int, attrs: Dict[int, str]):
+            self._emit_notification(resp.uid, resp.attrs)
+        elif resp.command_id == CMD_GET_APP_ATTRIBUTES and self.app_names is not None:
+            self.app_names.put(resp.app_id, resp.attrs.get(APP_ATTR_DISPLAY_NAME, ""))
+
+    def _app_name(self, app: str) -> str:
+        """Cached display name; on a miss the lookup is queued and "" returned right away."""
+        if self.app_names is None or not app or not self.cfg.app_names_enabled:
+            return ""
+        name = self.app_names.get(app)
+        if name is None:
+            self.cp.submit(CMD_GET_APP_ATTRIBUTES, app, app_attributes_request(app), 1)
+            return ""
+        return name
+
+    def _emit_notification(self, uid: int, attrs: Dict[int, str]):
         try:
             app = attrs.get(ATTR_APP_IDENTIFIER, "") or ""
             title = attrs.get(ATTR_TITLE, "") or ""
             msg = attrs.get(ATTR_MESSAGE, "") or ""
             date = attrs.get(ATTR_DATE, "") or ""
 
-            merged_text = "\n".join([app, title, msg, date]).strip()
-            if _contains_block_keyword(merged_text, self.cfg.block_keywords, self.cfg.block_case_insensitive):
+            m = self.metrics
+            if m is not None:
+                m.received.inc(device=self.addr)
+
+            # duplicates are dropped before any further work (filter, app name, codes)
+            if self.accept is not None and not self.accept(self.addr, uid, app, title, msg, date):
+                if m is not None:
+                    m.deduplicated.inc(device=self.addr)
+                return
+
+            app_name = self._app_name(app)
+            app_text = f"{app}\n{app_name}" if app_name else app
+            if self.blocker.is_blocked(app_text, title, msg, date):
                 self.log(f"[{self.addr}] [FILTER] blocked")
+                if m is not None:
+                    m.blocked.inc(device=self.addr)
                 return
 
-            bat = await self._read_battery()
+            bat = self._battery_cache
 
             codes: List[str] = []
             if self.cfg.enable_code_highlight:
-                codes = _extract_codes(merged_text, self.cfg.code_regex)
+                codes = self.codes.extract(app, title, msg)
 
             payload = {
                 "ts": _now_ts(),
@@ -489,12 +961,14 @@ class _ANCSSession:
                 "device": self.addr,
                 "battery": bat,
                 "app": app,
+                "app_name": app_name,
                 "title": title,
                 "msg": msg,
                 "date": date,
                 "codes": codes,
             }
             self.on_payload(payload)
+            self._maybe_fetch_full(uid, payload, attrs)
 
         except Exception as e:
             self.log(f"[{self.addr}] emit error: {e}")
@@ -509,19 +983,108 @@ class BridgeManager:
         cfg: BridgeConfig,
         log_func: Callable[[str], None],
         on_notification: Callable[[dict], None],
+        data_dir: Optional[str] = None,
     ):
-        self.cfg = cfg
         self.log = log_func
         self.on_notification = on_notification
+        self._data_dir = data_dir  # outbox location; defaults to the config.json folder
 
+        # per-device mode: one thread + loop per address; entries removed when the session ends
         self._threads: Dict[str, threading.Thread] = {}
         self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
         self._sessions: Dict[str, _ANCSSession] = {}
-
-        self._dedup: Dict[str, float] = {}
+        # shared mode: every session is a task on one loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # addresses asked to stop whose session may still be winding down
+        self._stopping: Set[str] = set()
+
+        self._dedup = DedupIndex()
         self._lock = threading.Lock()
 
+        self._pipeline: Optional[DeliveryPipeline] = None
+        self._batchers: Dict[str, Batcher] = {}  # dest -> pending batch (email digest, telegram coalescing)
+
+        self._outbox: Optional[Outbox] = None
+        self._outbox_failed = False
+        self._inflight: Set[int] = set()  # outbox ids currently queued in the pipeline
+        self._degraded: Set[str] = set()  # destinations whose last send failed transiently
+        self._replay_lock = threading.Lock()
+        self._replay_timer: Optional[threading.Timer] = None
+        self._router = Router()
+        self._app_names: Optional[AppNameCache] = None
+
+        self.metrics = BridgeMetrics()
+        self.metrics.gauge("nekolink_outbox_depth", "Deliveries not yet confirmed.", self.outbox_depth)
+        self.metrics.gauge(
+            "nekolink_delivery_queue_depth", "Jobs waiting per destination.",
+            lambda: {(d,): n for d, n in self.delivery_depths().items()}, ["dest"],
+        )
+        self.metrics.gauge(
+            "nekolink_device_connected", "1 while the BLE link is up.",
+            lambda: {(a,): int(bool(st["connected"])) for a, st in self.connection_stats().items()}, ["device"],
+        )
+        self._metrics_server: Optional[MetricsServer] = None
+
+        self.cfg = cfg
+
+    @property
+    def cfg(self) -> BridgeConfig:
+        return self._cfg
+
+    @cfg.setter
+    def cfg(self, cfg: BridgeConfig):
+        self._cfg = cfg
+        self._apply_runtime_config(cfg)
+
+    def _apply_runtime_config(self, cfg: BridgeConfig):
+        # compile per-notification matchers once here, not on the emit path
+        blocker = _compile_blocker(cfg.block_keywords, cfg.block_case_insensitive)
+        codes = _compile_codes(cfg, self.log)
+        for session in list(self._sessions.values()):
+            session.cfg = cfg
+            session.blocker = blocker
+            session.codes = codes
+            session.cp.max_inflight = max(1, int(cfg.ancs_cp_inflight or 1))
+            session.cp.timeout = float(cfg.ancs_cp_timeout_seconds or 5.0)
+        self._router = Router(cfg.routes, log=self.log)
+        if self._app_names is not None:
+            self._app_names.max_entries = max(1, int(cfg.app_names_max or 512))
+        self._configure_metrics_server(cfg)
+        if cfg.enable_windows_toast:
+            _load_toast()
+
+        self._dedup.window = float(int(cfg.dedup_seconds or 8))
+        self._dedup.max_entries = max(1, int(cfg.dedup_max_entries or 4096))
+
+        try:
+            HTTP_POOL.configure(cfg.http_pool_size, cfg.http_idle_seconds)
+        except Exception as e:
+            self.log(f"[MANAGER] config error: {e}")
+
+        if self._pipeline is not None:
+            self._configure_rates(self._pipeline, cfg)
+
+        for dest, batcher in list(self._batchers.items()):
+            settings = self._batch_settings(dest, cfg)
+            if settings is None:
+                self._batchers.pop(dest, None)
+                batcher.flush()
+            else:
+                batcher.window, batcher.max_items = settings[0], max(1, settings[1])
+
+    @staticmethod
+    def _batch_settings(dest: str, cfg: BridgeConfig) -> Optional[Tuple[float, int]]:
+        """(window seconds, max items) when dest is batched, else None."""
+        if dest == "email" and cfg.enable_email and cfg.email_digest_enabled:
+            return float(cfg.email_digest_seconds), int(cfg.email_digest_max_items)
+        if dest == "telegram" and cfg.enable_telegram and int(cfg.telegram_coalesce_ms or 0) > 0:
+            return cfg.telegram_coalesce_ms / 1000.0, int(cfg.telegram_coalesce_max)
+        return None
+
     async def scan_heart_rate(self, timeout: int = 8) -> List[Tuple[str, str, int]]:
+        _load_bleak()
         devices = await BleakScanner.discover(timeout=timeout)
         out: List[Tuple[str, str, int]] = []
         for d in devices:
@@ -547,22 +1110,56 @@ class BridgeManager:
         addrs = [a.strip() for a in (addrs or []) if a.strip()]
         if not addrs:
             return
+        _load_bleak()
+        self._get_outbox()
+        self._get_app_names()
         for addr in addrs:
-            if addr in self._threads and self._threads[addr].is_alive():
+            if self._is_running(addr):
                 continue
             self._start_one(addr)
 
-    def stop_all(self):
-        for addr in list(self._threads.keys()):
+    def stop_all(self, addrs: Optional[List[str]] = None):
+        """Stop every running session, or only those for addrs."""
+        running = set(self._threads) | set(self._tasks)
+        if addrs is not None:
+            running &= {a.strip() for a in addrs}
+        for addr in running:
             self._stop_one(addr)
 
+    def _is_running(self, addr: str) -> bool:
+        """True for a live session; one that is still stopping counts as stopped (it gets restarted)."""
+        session = self._sessions.get(addr)
+        if addr in self._stopping or (session is not None and session.stopping):
+            return False
+        task = self._tasks.get(addr)
+        if task is not None and not task.done():
+            return True
+        t = self._threads.get(addr)
+        return t is not None and t.is_alive()
+
+    def _new_session(self, addr: str) -> _ANCSSession:
+        return _ANCSSession(
+            addr, self.cfg, self.log, self._on_payload_internal,
+            accept=self._accept, app_names=self._get_app_names(), metrics=self.metrics,
+        )
+
     def _start_one(self, addr: str):
+        self._stopping.discard(addr)
+        if self.cfg.ble_shared_loop:
+            asyncio.run_coroutine_threadsafe(self._spawn(addr), self._ensure_loop())
+            self.log(f"[MANAGER] started {addr}")
+            return
+
+        previous = self._threads.get(addr)
+
         def _runner():
+            if previous is not None:
+                previous.join()  # the old session is still shutting down
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             self._loops[addr] = loop
 
-            session = _ANCSSession(addr, self.cfg, self.log, self._on_payload_internal)
+            session = self._new_session(addr)
             self._sessions[addr] = session
 
             async def _main():
@@ -581,37 +1178,111 @@ class BridgeManager:
                     loop.close()
                 except Exception:
                     pass
+                if self._sessions.get(addr) is session:
+                    self._sessions.pop(addr, None)
+                    self._loops.pop(addr, None)
+                if self._threads.get(addr) is threading.current_thread():
+                    self._threads.pop(addr, None)
 
         t = threading.Thread(target=_runner, daemon=True)
         self._threads[addr] = t
         t.start()
         self.log(f"[MANAGER] started {addr}")
 
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """The shared BLE loop, started on first use and kept until shutdown()."""
+        with self._lock:
+            if self._loop is not None and self._loop_thread is not None and self._loop_thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _runner():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                try:
+                    loop.run_forever()
+                finally:
+                    loop.close()
+
+            t = threading.Thread(target=_runner, name="nekolink-ble", daemon=True)
+            t.start()
+            ready.wait(5.0)
+            self._loop, self._loop_thread = loop, t
+            return loop
+
+    async def _spawn(self, addr: str):
+        """Runs on the shared loop: start (or restart) the session task for addr."""
+        old = self._tasks.get(addr)
+        if old is not None and not old.done():
+            session = self._sessions.get(addr)
+            if session is None or not session.stopping:
+                return  # already running
+            await asyncio.wait([old])  # still shutting down from a previous stop
+        session = self._new_session(addr)
+        self._sessions[addr] = session
+        task = asyncio.get_running_loop().create_task(session.run())
+        self._tasks[addr] = task
+
+        def _done(t: asyncio.Task):
+            if self._tasks.get(addr) is t:
+                self._tasks.pop(addr, None)
+                self._sessions.pop(addr, None)
+            if not t.cancelled() and t.exception() is not None:
+                self.log(f"[{addr}] loop error: {t.exception()}")
+
+        task.add_done_callback(_done)
+
     def _stop_one(self, addr: str):
+        self._stopping.add(addr)
         try:
-            loop = self._loops.get(addr)
             session = self._sessions.get(addr)
+            loop = self._loop if addr in self._tasks else self._loops.get(addr)
             if loop and session:
                 asyncio.run_coroutine_threadsafe(session.stop(), loop)
         except Exception:
             pass
         self.log(f"[MANAGER] stopping {addr}")
 
-    def _dedup_ok(self, payload: dict) -> bool:
-        window = int(getattr(self.cfg, "dedup_seconds", 8) or 8)
-        key = f"{payload.get('device')}|{payload.get('app')}|{payload.get('title')}|{payload.get('msg')}|{payload.get('date')}"
-        now = _now_ts()
+    def _stop_loop(self, timeout: float):
+        """Wait for shared-loop sessions to finish, then stop the loop and its thread."""
         with self._lock:
-            last = self._dedup.get(key)
-            if last is not None and (now - last) < window:
-                return False
-            self._dedup[key] = now
-        return True
-
-    def _on_payload_internal(self, payload: dict):
-        if not self._dedup_ok(payload):
+            loop, t = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is None or t is None:
             return
 
+        async def _drain():
+            tasks = [x for x in self._tasks.values() if not x.done()]
+            if tasks:
+                _done, pending = await asyncio.wait(tasks, timeout=timeout)
+                for x in pending:
+                    x.cancel()
+                if pending:
+                    await asyncio.wait(pending, timeout=1.0)
+
+        try:
+            asyncio.run_coroutine_threadsafe(_drain(), loop).result(timeout + 2.0)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        t.join(timeout=2.0)
+
+    def _accept(self, device: str, uid: int, app: str, title: str, msg: str, date: str) -> bool:
+        """
+        Dedup gate called by the sessions as soon as a notification is parsed.
+        In cross-adapter mode the BLE address is left out of the key, so the same
+        notification arriving over a second link is recognised by its ANCS UID,
+        app and content.
+        """
+        if self.cfg.dedup_cross_adapter:
+            key = fingerprint(("uid", uid, app, title, msg, date))
+        else:
+            key = fingerprint((device, app, title, msg, date))
+        return self._dedup.check_and_add(key, _now_ts())
+
+    def _on_payload_internal(self, payload: dict):
+        # dedup already happened in the session (see _accept)
         try:
             self._forward(payload)
         except Exception as e:
@@ -622,71 +1293,423 @@ class BridgeManager:
         except Exception:
             pass
 
-    def _forward(self, payload: dict):
-        cfg = self.cfg
-        text = _format_message(payload, cfg)
-
-        if cfg.enable_windows_toast and show_toast is not None:
-            try:
-                show_toast("NekoLink", text)
-            except Exception as e:
-                self.log(f"[TOAST] failed: {e}")
-
+    def _get_pipeline(self) -> DeliveryPipeline:
+        with self._lock:
+            if self._pipeline is None:
+                size = int(getattr(self.cfg, "delivery_queue_size", 200) or 200)
+                self._pipeline = DeliveryPipeline(self.log, maxsize=size)
+                self._configure_rates(self._pipeline, self.cfg)
+            return self._pipeline
+
+    @staticmethod
+    def _configure_rates(pipeline: DeliveryPipeline, cfg: BridgeConfig):
+        pol = pipeline.policy
+        pol.retry_max = max(0, int(cfg.retry_max))
+        pol.base_seconds = max(0.0, float(cfg.retry_base_seconds))
+        pol.max_delay_seconds = max(pol.base_seconds, float(cfg.retry_max_delay_seconds))
+        pol.breaker_threshold = max(1, int(cfg.breaker_threshold))
+        pol.breaker_cooldown_seconds = max(1.0, float(cfg.breaker_cooldown_seconds))
+
+        burst = int(cfg.rate_burst or 1)
         if cfg.enable_telegram:
-            try:
-                send_telegram(cfg.telegram_bot_token, cfg.telegram_chat_id, text)
-            except Exception as e:
-                self.log(f"[TG] failed: {e}")
-
+            pipeline.set_rate("telegram", cfg.telegram_rate_per_min, burst)
         if cfg.enable_dingtalk:
-            try:
-                send_dingtalk_text(cfg.dingtalk_webhook, cfg.dingtalk_secret, text)
-            except Exception as e:
-                self.log(f"[DT] failed: {e}")
-
+            pipeline.set_rate("dingtalk", cfg.dingtalk_rate_per_min, burst)
         if cfg.enable_gotify:
+            pipeline.set_rate("gotify", cfg.gotify_rate_per_min, burst)
+        if cfg.enable_email:
+            pipeline.set_rate("email", cfg.email_rate_per_min, burst)
+
+    def delivery_depths(self) -> Dict[str, int]:
+        p = self._pipeline
+        return p.depths() if p is not None else {}
+
+    def _configure_metrics_server(self, cfg: BridgeConfig):
+        srv = self._metrics_server
+        want = (cfg.metrics_bind, int(cfg.metrics_port)) if cfg.metrics_enabled else None
+        if srv is not None and (want is None or (srv.host, srv.port) != want):
+            srv.close()
+            self._metrics_server = srv = None
+        if want is not None and srv is None:
             try:
-                send_gotify(cfg.gotify_url, cfg.gotify_token, "NekoLink", text, priority=cfg.gotify_priority)
+                self._metrics_server = MetricsServer(self.metrics.registry, *want)
+                self.log(f"[METRICS] serving http://{want[0]}:{want[1]}/metrics")
             except Exception as e:
-                self.log(f"[GOTIFY] failed: {e}")
-
-        if cfg.enable_email:
+                self.log(f"[METRICS] endpoint failed: {e}")
+
+    def connection_stats(self) -> Dict[str, Dict[str, object]]:
+        """Per device: connected flag, connect/reconnect counts and reconnect times (s)."""
+        return {addr: dict(s.stats) for addr, s in list(self._sessions.items())}
+
+    def delivery_stats(self) -> Dict[str, Dict[str, object]]:
+        """Per destination: queue depth, throttling, retry count and circuit breaker state."""
+        p = self._pipeline
+        return p.stats() if p is not None else {}
+
+    # ---------- outbox ----------
+    def _get_app_names(self) -> Optional[AppNameCache]:
+        """Load the app-name cache once (startup warm-up); None when disabled."""
+        if not self.cfg.app_names_enabled:
+            return None
+        with self._lock:
+            if self._app_names is None:
+                data_dir = self._data_dir or os.path.dirname(get_config_path())
+                self._app_names = AppNameCache(
+                    os.path.join(data_dir, "app_names.json"), self.cfg.app_names_max, log=self.log
+                )
+                n = self._app_names.load()
+                if n:
+                    self.log(f"[APPNAME] {n} cached names loaded")
+            return self._app_names
+
+    def _get_outbox(self) -> Optional[Outbox]:
+        if not self.cfg.outbox_enabled:
+            return None
+        with self._lock:
+            if self._outbox is not None or self._outbox_failed:
+                return self._outbox
             try:
-                send_email(cfg, "NekoLink Notification", text)
+                data_dir = self._data_dir or os.path.dirname(get_config_path())
+                self._outbox = Outbox(
+                    os.path.join(data_dir, "outbox.db"),
+                    self.log,
+                    max_age_seconds=float(self.cfg.outbox_max_age_hours) * 3600,
+                )
             except Exception as e:
-                self.log(f"[MAIL] failed: {e}")
+                self._outbox_failed = True
+                self.log(f"[OUTBOX] disabled: {e}")
+                return None
+        # anything left over from the last run goes out first
+        threading.Thread(target=self._replay_outbox, daemon=True).start()
+        return self._outbox
+
+    def outbox_depth(self) -> int:
+        ob = self._outbox
+        return ob.depth() if ob is not None else 0
+
+    def _replay_outbox(self):
+        outbox = self._outbox
+        if outbox is None:
+            return
+        if not self._replay_lock.acquire(blocking=False):
+            # one replay at a time; rows it skipped are picked up by a later run
+            self._schedule_replay()
+            return
+        try:
+            seen: Set[int] = set()  # rows replayed by this run; a failed one waits for the next
+            while self._outbox is outbox:
+                with self._lock:
+                    exclude = seen | self._inflight
+                cfg = self.cfg
+                rows = [r for r in outbox.pending(exclude) if self._dest_enabled(r[1], cfg)]
+                if not rows:
+                    return
+                self.log(f"[OUTBOX] replaying {len(rows)} pending deliveries")
+                if not self._feed_replay(outbox, rows, seen):
+                    self._schedule_replay()
+                    return
+        except Exception as e:
+            self.log(f"[OUTBOX] replay error: {e}")
+        finally:
+            self._replay_lock.release()
+
+    def _feed_replay(self, outbox: Outbox, rows: List[Tuple[int, str, dict]], seen: Set[int]) -> bool:
+        """
+        Queue rows oldest first, only as many per destination as its queue has room
+        for, so nothing is evicted and the order holds. False if a queue stayed full.
+        """
+        pipeline = self._get_pipeline()
+        per_dest: Dict[str, List[Tuple[int, dict]]] = {}
+        for oid, dest, spec in rows:
+            per_dest.setdefault(dest, []).append((oid, spec))
+        wait = float(self.cfg.delivery_deadline_seconds or 60)
+        while per_dest:
+            if self._outbox is not outbox or self._pipeline is not pipeline:
+                return True  # shutting down; the rest stays in the outbox
+            for dest in list(per_dest):
+                todo = per_dest[dest]
+                room = pipeline.wait_room(dest, wait if len(per_dest) == 1 else 0)
+                for oid, spec in todo[:room]:
+                    seen.add(oid)
+                    self._submit(dest, [spec], replay_ids=[oid])
+                del todo[:room]
+                if not todo:
+                    del per_dest[dest]
+                elif len(per_dest) == 1 and room == 0:
+                    return False
+            if len(per_dest) > 1:
+                time.sleep(0.05)
+        return True
+
+    def _schedule_replay(self):
+        with self._lock:
+            if self._replay_timer is not None:
+                return
+            delay = max(1.0, float(self.cfg.outbox_retry_seconds or 30))
+            self._replay_timer = threading.Timer(delay, self._replay_timer_fired)
+            self._replay_timer.daemon = True
+            self._replay_timer.start()
+
+    def _replay_timer_fired(self):
+        with self._lock:
+            self._replay_timer = None
+        self._replay_outbox()
+
+    def _release(self, oids: List[Optional[int]], dest: str):
+        """Deliveries that were not confirmed stay in the outbox for a later replay."""
+        oids = [o for o in oids if o is not None]
+        if not oids:
+            return
+        with self._lock:
+            self._inflight.difference_update(oids)
+            self._degraded.add(dest)
+        self._schedule_replay()
+
+    def _finish(self, oid: Optional[int], dest: str):
+        if oid is None:
+            return
+        outbox = self._outbox
+        if outbox is not None:
+            outbox.done(oid)
+        with self._lock:
+            self._inflight.discard(oid)
+            recovered = dest in self._degraded
+            self._degraded.discard(dest)
+        if recovered:
+            # destination is reachable again: send what piled up meanwhile (not on the
+            # worker thread, the replay waits for room in this worker's queue)
+            threading.Thread(target=self._replay_outbox, daemon=True).start()
+
+    @staticmethod
+    def _dest_enabled(dest: str, cfg: BridgeConfig) -> bool:
+        return bool(getattr(cfg, f"enable_{dest}", False))
+
+    # ---------- delivery ----------
+    def _send_spec(self, spec: dict, timeout: float):
+        """Perform one outbound call described by spec, using the current settings."""
+        cfg = self.cfg
+        kind = spec.get("kind")
+        text = spec.get("text") or ""
+        if kind == "toast":
+            if show_toast is not None:
+                show_toast("NekoLink", text)
+        elif kind == "telegram":
+            # specs are split to one message each; this only splits rows recorded before that
+            send_telegram_long(cfg.telegram_bot_token, cfg.telegram_chat_id, text, timeout=timeout)
+        elif kind == "dingtalk":
+            send_dingtalk_text(cfg.dingtalk_webhook, cfg.dingtalk_secret, text, timeout=timeout)
+        elif kind == "gotify":
+            send_gotify(
+                cfg.gotify_url,
+                cfg.gotify_token,
+                spec.get("title") or "NekoLink",
+                text,
+                priority=int(spec.get("priority", cfg.gotify_priority)),
+                timeout=timeout,
+            )
+        elif kind == "email":
+            send_email(cfg, spec.get("subject") or "NekoLink Notification", text, timeout=timeout)
+        else:
+            raise ValueError(f"Unknown delivery kind: {kind}")
+
+    def _run_step(self, dest: str, spec: dict, oids: List[int], timeout: float):
+        try:
+            self._send_spec(spec, timeout)
+        except Exception as e:
+            self.metrics.deliveries.inc(dest=dest, result="failed")
+            # transient failures are retried by the worker; if it gives up the step
+            # comes back through on_skip and stays in the outbox
+            if not is_transient_error(e):
+                for oid in oids:
+                    self._finish(oid, dest)
+            raise
+        self.metrics.deliveries.inc(dest=dest, result="ok")
+        if spec.get("ts"):
+            self.metrics.delivery_latency.observe(max(0.0, _now_ts() - float(spec["ts"])), dest=dest)
+        for oid in oids:
+            self._finish(oid, dest)
+
+    def _submit(
+        self,
+        dest: str,
+        specs: List[dict],
+        replay_ids: Optional[List[int]] = None,
+        covers: Optional[List[int]] = None,
+    ):
+        """
+        Record specs in the outbox (unless replaying) and queue them for dest.
+        covers: rows already in the outbox that the single spec confirms instead
+        of a row of its own (an email digest and its items).
+        """
+        if not specs:
+            return
+        outbox = self._get_outbox() if dest != "toast" else None
+
+        rows: List[List[int]] = []
+        for i, spec in enumerate(specs):
+            if covers is not None:
+                rows.append(list(covers))
+            elif replay_ids is not None:
+                rows.append([replay_ids[i]])
+            elif outbox is not None:
+                rows.append([outbox.put(dest, spec)])
+            else:
+                rows.append([])
+        with self._lock:
+            self._inflight.update(o for r in rows for o in r)
+
+        steps = [
+            (spec["tag"], functools.partial(self._run_step, dest, spec, r))
+            for spec, r in zip(specs, rows)
+        ]
+        self._get_pipeline().submit(
+            dest,
+            steps,
+            float(self.cfg.delivery_deadline_seconds or 60),
+            on_skip=lambda skipped: self._release([o for r in rows[len(rows) - len(skipped):] for o in r], dest),
+            evictable=replay_ids is None,
+        )
+
+    def _get_batcher(self, dest: str, on_flush: Callable[[List[dict]], None]) -> Batcher:
+        with self._lock:
+            b = self._batchers.get(dest)
+            if b is None:
+                window, max_items = self._batch_settings(dest, self.cfg) or (0.0, 1)
+                b = Batcher(on_flush, window=window, max_items=max_items, log=self.log)
+                self._batchers[dest] = b
+            return b
+
+    def _flush_email_digest(self, items: List[dict]):
+        payloads = [it["payload"] for it in items]
+        body = _format_digest(payloads, self.cfg)
+        subject = f"NekoLink Digest ({len(payloads)})"
+        ts = min((p.get("ts") or _now_ts()) for p in payloads)
+        self._submit(
+            "email",
+            [{"tag": "MAIL-digest", "kind": "email", "subject": subject, "text": body, "ts": ts}],
+            covers=[it["oid"] for it in items if it["oid"] is not None],
+        )
+
+    def _flush_telegram_batch(self, items: List[dict]):
+        merged = "\n\n".join(it["text"] for it in items)
+        ts = min((it.get("ts") or _now_ts()) for it in items)
+        self._submit("telegram", _telegram_specs("TG", merged, ts))
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop all sessions and give queued deliveries a chance to go out."""
+        self.stop_all()
+        self._stop_loop(timeout)
+        with self._lock:
+            batchers = list(self._batchers.values())
+            self._batchers.clear()
+        for b in batchers:
+            b.flush()
+        with self._lock:
+            p, self._pipeline = self._pipeline, None
+            timer, self._replay_timer = self._replay_timer, None
+        if timer is not None:
+            timer.cancel()
+        if p is not None:
+            p.close(timeout=timeout)
+        with self._lock:
+            ob, self._outbox = self._outbox, None
+        if ob is not None:
+            # whatever is still unconfirmed is replayed on next start
+            ob.close()
+        with self._lock:
+            names, self._app_names = self._app_names, None
+        if names is not None:
+            names.close()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+            self._metrics_server = None
+        HTTP_POOL.close()
+        smtp_session = sys.modules.get("smtp_session")
+        if smtp_session is not None:
+            smtp_session.SESSIONS.close()
+
+    def _forward(self, payload: dict):
+        """
+        Build the per-destination deliveries for one notification and hand them to
+        the delivery pipeline. Never blocks on the network (called from the BLE loop).
+        """
+        cfg = self.cfg
+        text = _format_message(payload, cfg)
 
+        code_text = ""
         if cfg.enable_code_highlight and cfg.code_send_separately:
             codes = payload.get("codes") or []
+            if payload.get("full_message"):
+                # codes from the preview already went out with the first message
+                sent = set(payload.get("codes_sent") or [])
+                codes = [c for c in codes if c not in sent]
             if codes:
                 code_text = f"{cfg.code_separate_prefix}: " + " ".join(codes)
 
-                if cfg.enable_telegram:
-                    try:
-                        send_telegram(cfg.telegram_bot_token, cfg.telegram_chat_id, code_text)
-                    except Exception as e:
-                        self.log(f"[TG-code] failed: {e}")
-
-                if cfg.enable_dingtalk:
-                    try:
-                        send_dingtalk_text(cfg.dingtalk_webhook, cfg.dingtalk_secret, code_text)
-                    except Exception as e:
-                        self.log(f"[DT-code] failed: {e}")
-
-                if cfg.enable_gotify:
-                    try:
-                        send_gotify(
-                            cfg.gotify_url,
-                            cfg.gotify_token,
-                            "NekoLink Code",
-                            code_text,
-                            priority=max(7, int(cfg.gotify_priority)),
-                        )
-                    except Exception as e:
-                        self.log(f"[GOTIFY-code] failed: {e}")
-
-                if cfg.enable_email:
-                    try:
-                        send_email(cfg, "NekoLink Code", code_text)
-                    except Exception as e:
-                        self.log(f"[MAIL-code] failed: {e}")
\ No newline at end of file
+        routed = self._router.route(payload)
+
+        def want(dest: str) -> bool:
+            return routed is None or dest in routed
+
+        jobs: Dict[str, List[dict]] = {}
+        batched: List[str] = []
+
+        if cfg.enable_windows_toast and show_toast is not None and want("toast"):
+            jobs["toast"] = [{"tag": "TOAST", "kind": "toast", "text": text}]
+
+        send_tg = cfg.enable_telegram and want("telegram")
+        if send_tg and self._batch_settings("telegram", cfg) is not None:
+            # codes go out right away; the full text waits for the coalescing window
+            if code_text:
+                jobs["telegram"] = [{"tag": "TG-code", "kind": "telegram", "text": code_text}]
+            self._get_batcher("telegram", self._flush_telegram_batch).add({"text": text, "ts": payload.get("ts")})
+            batched.append("telegram")
+        elif send_tg:
+            jobs["telegram"] = _telegram_specs("TG", text)
+            if code_text:
+                jobs["telegram"].append({"tag": "TG-code", "kind": "telegram", "text": code_text})
+
+        if cfg.enable_dingtalk and want("dingtalk"):
+            jobs["dingtalk"] = [{"tag": "DT", "kind": "dingtalk", "text": text}]
+            if code_text:
+                jobs["dingtalk"].append({"tag": "DT-code", "kind": "dingtalk", "text": code_text})
+
+        if cfg.enable_gotify and want("gotify"):
+            jobs["gotify"] = [
+                {"tag": "GOTIFY", "kind": "gotify", "title": "NekoLink", "text": text, "priority": int(cfg.gotify_priority)}
+            ]
+            if code_text:
+                jobs["gotify"].append({
+                    "tag": "GOTIFY-code",
+                    "kind": "gotify",
+                    "title": "NekoLink Code",
+                    "text": code_text,
+                    "priority": max(7, int(cfg.gotify_priority)),
+                })
+
+        send_mail = cfg.enable_email and want("email")
+        if send_mail and self._batch_settings("email", cfg) is not None:
+            # codes are listed at the top of the digest instead of sent on their own. The
+            # item is recorded as a plain mail while it waits, so a crash before the digest
+            # goes out replays it on its own; the digest confirms these rows.
+            outbox = self._get_outbox()
+            oid = None
+            if outbox is not None:
+                oid = outbox.put("email", {"tag": "MAIL", "kind": "email", "subject": "NekoLink Notification",
+                                           "text": text, "ts": payload.get("ts")})
+                with self._lock:
+                    self._inflight.add(oid)
+            self._get_batcher("email", self._flush_email_digest).add({"payload": payload, "oid": oid})
+            batched.append("email")
+        elif send_mail:
+            jobs["email"] = [{"tag": "MAIL", "kind": "email", "subject": "NekoLink Notification", "text": text}]
+            if code_text:
+                jobs["email"].append({"tag": "MAIL-code", "kind": "email", "subject": "NekoLink Code", "text": code_text})
+
+        for dest in set(jobs) | set(batched):
+            self.metrics.forwarded.inc(dest=dest)
+        ts = payload.get("ts")
+        for dest, specs in jobs.items():
+            for spec in specs:
+                spec["ts"] = ts  # for the delivery latency histogram
+            self._submit(dest, specs)
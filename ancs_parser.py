@@ -0,0 +1,208 @@
+# ancs_parser.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+CMD_GET_NOTIFICATION_ATTRIBUTES = 0
+CMD_GET_APP_ATTRIBUTES = 1
+
+# parser states
+_CMD, _UID, _APP_ID, _ATTR_HEAD, _ATTR_BODY, _DISCARD = range(6)
+
+Bytes = Union[bytes, bytearray]
+
+
+class DataSourceResponse(NamedTuple):
+    command_id: int
+    uid: int  # cmd 0 only
+    app_id: str  # cmd 1 only
+    attrs: Dict[int, str]
+
+
+class DataSourceParser:
+    """
+    Resumable parser for the ANCS Data Source stream.
+
+    Responses carry no total length: one ends after the number of attributes
+    that was requested. That count comes from expect() for a single UID / app
+    (one entry per request sent, so a re-sent request's second answer still
+    parses), or from attr_counts (per command ID) when given. A response with
+    neither cannot be framed: it is dropped together with the rest of the
+    chunk it started in, and parsing resumes with the next chunk. Fields are
+    read straight out of a
+    memoryview of the incoming chunk; only bytes of a response that is still
+    incomplete are kept, and parsing continues from where it stopped when the
+    next chunk arrives. Several responses in one chunk are all delivered.
+    """
+
+    def __init__(
+        self,
+        on_response: Callable[[DataSourceResponse], None],
+        attr_counts: Optional[Dict[int, int]] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ):
+        self.on_response = on_response
+        self.attr_counts: Dict[int, int] = dict(attr_counts or {})
+        self.log = log
+        self._expected: Dict[Tuple[int, object], List[int]] = {}
+        self._buf = bytearray()
+        self.responses = 0
+        self.skipped_bytes = 0
+        self.unexpected = 0
+        self._reset()
+
+    def _reset(self):
+        self._state = _CMD
+        self._cmd = -1
+        self._uid = 0
+        self._app_id = ""
+        self._attrs: Dict[int, str] = {}
+        self._left = 0
+        self._attr_id = 0
+        self._attr_len = 0
+        self._scan = 0  # app-id bytes already searched for the NUL terminator
+
+    def expect(self, command_id: int, key, count: int):
+        """Attribute count for one request sent (key = UID for cmd 0, app id for cmd 1)."""
+        self._expected.setdefault((command_id, key), []).append(int(count))
+
+    def forget(self, command_id: int, key, n: Optional[int] = None):
+        """Drop the n oldest expectations for key (all when n is None)."""
+        k = (command_id, key)
+        counts = self._expected.get(k)
+        if counts is None:
+            return
+        del counts[: len(counts) if n is None else n]
+        if not counts:
+            del self._expected[k]
+
+    def expecting(self, command_id: int, key) -> int:
+        return len(self._expected.get((command_id, key), ()))
+
+    @property
+    def receiving(self) -> Optional[Tuple[int, object]]:
+        """(command, UID / app id) of the response whose attributes are arriving, if any."""
+        if self._state not in (_ATTR_HEAD, _ATTR_BODY):
+            return None
+        return (self._cmd, self._uid if self._cmd == CMD_GET_NOTIFICATION_ATTRIBUTES else self._app_id)
+
+    def abandon(self):
+        """Give up on the response in progress (it stalled); the next chunk starts fresh."""
+        if self._buf or self._state != _CMD:
+            self.skipped_bytes += len(self._buf)
+            self._buf = bytearray()
+            self._reset()
+
+    def clear(self):
+        """Drop partial state, e.g. after a disconnect."""
+        self._buf = bytearray()
+        self._expected.clear()
+        self._reset()
+
+    @property
+    def pending_bytes(self) -> int:
+        return len(self._buf)
+
+    def feed(self, chunk: Bytes) -> int:
+        """Consume one Data Source notification; returns responses completed."""
+        if not chunk:
+            return 0
+        before = self.responses
+        if self._buf:
+            self._buf += chunk
+            used = self._run(self._buf)
+            del self._buf[:used]
+        else:
+            # nothing pending: parse the chunk in place, keep only the tail
+            used = self._run(chunk)
+            if used < len(chunk):
+                self._buf += memoryview(chunk)[used:]
+        return self.responses - before
+
+    def _begin_attrs(self, key):
+        k = (self._cmd, key)
+        counts = self._expected.get(k)
+        if counts:
+            self._left = counts.pop(0)
+            if not counts:
+                del self._expected[k]
+        elif self._cmd in self.attr_counts:
+            self._left = self.attr_counts[self._cmd]
+        else:
+            self.unexpected += 1
+            if self.log:
+                self.log(f"[DS] unexpected response {k}, dropped")
+            self._state = _DISCARD
+            return
+        self._attrs = {}
+        self._state = _ATTR_HEAD
+        if self._left <= 0:
+            self._finish()
+
+    def _finish(self):
+        resp = DataSourceResponse(self._cmd, self._uid, self._app_id, self._attrs)
+        self.responses += 1
+        self._reset()
+        try:
+            self.on_response(resp)
+        except Exception as e:
+            if self.log:
+                self.log(f"[DS] handler error: {e}")
+
+    def _run(self, data: Bytes) -> int:
+        pos = 0
+        n = len(data)
+        with memoryview(data) as mv:
+            while True:
+                st = self._state
+                if st == _ATTR_HEAD:
+                    if n - pos < 3:
+                        break
+                    self._attr_id = mv[pos]
+                    self._attr_len = mv[pos + 1] | (mv[pos + 2] << 8)
+                    pos += 3
+                    self._state = _ATTR_BODY
+                elif st == _ATTR_BODY:
+                    ln = self._attr_len
+                    if n - pos < ln:
+                        break
+                    self._attrs[self._attr_id] = str(mv[pos: pos + ln], "utf-8", "ignore")
+                    pos += ln
+                    self._left -= 1
+                    if self._left <= 0:
+                        self._finish()
+                    else:
+                        self._state = _ATTR_HEAD
+                elif st == _CMD:
+                    if pos >= n:
+                        break
+                    cmd = mv[pos]
+                    pos += 1
+                    if cmd == CMD_GET_NOTIFICATION_ATTRIBUTES:
+                        self._cmd, self._state = cmd, _UID
+                    elif cmd == CMD_GET_APP_ATTRIBUTES:
+                        self._cmd, self._state = cmd, _APP_ID
+                    else:
+                        # no length to skip by: drop this byte and resync on the next one
+                        self.skipped_bytes += 1
+                elif st == _DISCARD:
+                    self.skipped_bytes += n - pos
+                    pos = n
+                    self._reset()
+                    break
+                elif st == _UID:
+                    if n - pos < 4:
+                        break
+                    self._uid = int.from_bytes(mv[pos: pos + 4], "little")
+                    pos += 4
+                    self._begin_attrs(self._uid)
+                else:  # _APP_ID
+                    end = data.find(b"\x00", pos + self._scan)
+                    if end < 0:
+                        self._scan = n - pos
+                        break
+                    self._app_id = str(mv[pos:end], "utf-8", "ignore")
+                    pos = end + 1
+                    self._begin_attrs(self._app_id)
+        return pos
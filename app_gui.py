@@ -44,6 +44,7 @@ class App(tb.Window):
         self.manager = BridgeManager(self.cfg, self.log, self.on_notification)
         self.running = False
         self.history = []  # list of payload dict
+        self._rows = {}  # (device, uid) -> history row, so a full-message follow-up updates it
 
         icon_path = ICON_PATH if os.path.exists(ICON_PATH) else None
         self.tray = TrayController(
@@ -52,7 +53,7 @@ class App(tb.Window):
             on_exit=self.exit_app,
             icon_path=icon_path,
         )
-        self.tray.start()
+        self.after_idle(self.tray.start)  # after the first paint
 
         self.ui = {}  # widgets needing i18n refresh
 
@@ -176,6 +177,7 @@ class App(tb.Window):
         self.ui["btn_scan"].config(text=i18n.t("scan"))
         self.ui["btn_add_addr"].config(text=i18n.t("add"))
         self.ui["btn_remove_addr"].config(text=i18n.t("remove_selected"))
+        self.ui["chk_dedup_cross"].config(text=i18n.t("dedup_cross_adapter"))
         self.ui["txt_scan_hint"].config(text=i18n.t("scan_hint"))
         self.ui["btn_save_devices"].config(text=i18n.t("save"))
 
@@ -198,6 +200,7 @@ class App(tb.Window):
         self.ui["btn_copy_history"].config(text=i18n.t("copy_selected"))
         self.ui["lbl_logs_title"].config(text=i18n.t("tab_logs"))
         self.ui["btn_clear_logs"].config(text=i18n.t("clear"))
+        self.ui["btn_delivery_status"].config(text=i18n.t("delivery_status"))
 
         # destinations bottom save
         if "btn_save_dest" in self.ui:
@@ -284,6 +287,12 @@ class App(tb.Window):
         self.ui["btn_remove_addr"] = tb.Button(ctl, text="", bootstyle="warning", command=self.remove_selected_addr)
         self.ui["btn_remove_addr"].pack(side=LEFT)
 
+        self.var_dedup_cross = tk.BooleanVar(value=getattr(self.cfg, "dedup_cross_adapter", False))
+        self.ui["chk_dedup_cross"] = tb.Checkbutton(
+            frm, text="", variable=self.var_dedup_cross, bootstyle="round-toggle"
+        )
+        self.ui["chk_dedup_cross"].pack(anchor=W, pady=(10, 0))
+
         tb.Separator(frm).pack(fill=X, pady=12)
 
         self.ui["txt_scan_hint"] = tb.Label(frm, text="", bootstyle="secondary")
@@ -452,8 +461,17 @@ class App(tb.Window):
         tb.Entry(mail, textvariable=self.var_email_from, width=36).grid(row=4, column=1, sticky=W, pady=2)
         tb.Label(mail, text="To").grid(row=5, column=0, sticky=W)
         tb.Entry(mail, textvariable=self.var_email_to, width=36).grid(row=5, column=1, sticky=W, pady=2)
+
+        self.var_mail_digest = tk.BooleanVar(value=getattr(self.cfg, "email_digest_enabled", False))
+        self.var_mail_digest_sec = tk.StringVar(value=str(getattr(self.cfg, "email_digest_seconds", 300)))
+        tb.Checkbutton(mail, text="Digest mode", variable=self.var_mail_digest, bootstyle="round-toggle").grid(
+            row=6, column=0, sticky=W, pady=(6, 2)
+        )
+        tb.Label(mail, text="Window (sec)").grid(row=7, column=0, sticky=W)
+        tb.Entry(mail, textvariable=self.var_mail_digest_sec, width=8).grid(row=7, column=1, sticky=W, pady=2)
+
         tb.Button(mail, text="Test", bootstyle="success", command=self.test_email).grid(
-            row=6, column=1, sticky=W, pady=(8, 0)
+            row=8, column=1, sticky=W, pady=(8, 0)
         )
 
         # bottom fixed bar
@@ -551,6 +569,8 @@ class App(tb.Window):
 
         self.ui["btn_clear_logs"] = tb.Button(top, text="", bootstyle="warning", command=self.clear_logs)
         self.ui["btn_clear_logs"].pack(side=RIGHT)
+        self.ui["btn_delivery_status"] = tb.Button(top, text="", bootstyle="info", command=self.log_delivery_status)
+        self.ui["btn_delivery_status"].pack(side=RIGHT, padx=(0, 8))
 
         self.txt_logs = tk.Text(frm, wrap="word", height=10)
         self.txt_logs.pack(fill=BOTH, expand=True)
@@ -563,11 +583,13 @@ class App(tb.Window):
     def on_notification(self, payload: dict):
         bat = payload.get("battery")
         bat_text = f"{bat}%" if isinstance(bat, int) else "--"
+        app = payload.get("app", "")
+        app_name = payload.get("app_name") or ""
 
         preview_text = (
             f"Device: {payload.get('device')}\n"
             f"Battery: {bat_text}\n"
-            f"App: {payload.get('app')}\n"
+            f"App: {f'{app_name} ({app})' if app_name else app}\n"
             f"Title: {payload.get('title')}\n"
             f"Msg: {payload.get('msg')}\n"
             f"Codes: {' '.join(payload.get('codes') or [])}\n"
@@ -579,11 +601,19 @@ class App(tb.Window):
         # history table
         t = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(payload["ts"]))
         codes = " ".join(payload.get("codes") or [])
-        self.tree.insert(
+        key = (payload.get("device", ""), payload.get("uid"))
+        iid = self._rows.get(key)
+        if payload.get("full_message") and iid and self.tree.exists(iid):
+            self.tree.set(iid, "msg", payload.get("msg", ""))
+            self.tree.set(iid, "codes", codes)
+            return
+        self._rows[key] = self.tree.insert(
             "", "end",
-            values=(t, payload.get("device", ""), bat_text, payload.get("app", ""),
+            values=(t, payload.get("device", ""), bat_text, app_name or app,
                     payload.get("title", ""), payload.get("msg", ""), codes)
         )
+        if len(self._rows) > 2000:
+            self._rows.pop(next(iter(self._rows)))
 
         # prune
         limit = int(self.safe_int(self.var_history_limit.get(), default=self.cfg.history_limit))
@@ -692,6 +722,28 @@ class App(tb.Window):
     def clear_logs(self):
         self.txt_logs.delete("1.0", "end")
 
+    def log_delivery_status(self):
+        stats = self.manager.delivery_stats()
+        if not stats:
+            self.log("[STATUS] no deliveries yet")
+        for dest, st in stats.items():
+            line = (
+                f"[STATUS] {dest}: queue={st['depth']} retries={st['retries']} "
+                f"breaker={st['breaker']} throttled={st['throttled_s']:.1f}s"
+            )
+            if st["breaker_retry_in_s"]:
+                line += f" (probe in {st['breaker_retry_in_s']:.0f}s)"
+            self.log(line)
+        self.log(f"[STATUS] outbox pending={self.manager.outbox_depth()}")
+        for addr, st in self.manager.connection_stats().items():
+            line = (
+                f"[STATUS] {addr}: connected={st['connected']} reconnects={st['reconnects']} "
+                f"failed={st['failed_attempts']}"
+            )
+            if st["last_reconnect_s"] is not None:
+                line += f" last={st['last_reconnect_s']:.1f}s max={st['max_reconnect_s']:.1f}s"
+            self.log(line)
+
     # ---------- Tests ----------
     def test_telegram(self):
         token = self.var_tg_token.get().strip()
@@ -760,6 +812,10 @@ class App(tb.Window):
             self.on_stop()
         except Exception:
             pass
+        try:
+            self.manager.shutdown(timeout=3.0)
+        except Exception:
+            pass
         try:
             self.tray.stop()
         except Exception:
@@ -784,10 +840,25 @@ class App(tb.Window):
 
             ble_addresses=addrs,
             auto_pick_heart_rate=False,
+            ble_shared_loop=self.cfg.ble_shared_loop,
+            reconnect_base_seconds=self.cfg.reconnect_base_seconds,
+            reconnect_max_seconds=self.cfg.reconnect_max_seconds,
+            ancs_cp_inflight=self.cfg.ancs_cp_inflight,
+            ancs_cp_timeout_seconds=self.cfg.ancs_cp_timeout_seconds,
+            ancs_cp_write_without_response=self.cfg.ancs_cp_write_without_response,
+            app_names_enabled=self.cfg.app_names_enabled,
+            app_names_max=self.cfg.app_names_max,
+            ancs_title_len=self.cfg.ancs_title_len,
+            ancs_msg_preview_len=self.cfg.ancs_msg_preview_len,
+            ancs_fetch_full_message=self.cfg.ancs_fetch_full_message,
+            ancs_msg_full_len=self.cfg.ancs_msg_full_len,
+            ancs_msg_full_len_apps=self.cfg.ancs_msg_full_len_apps,
 
             enable_telegram=bool(self.var_tg_on.get()),
             telegram_bot_token=self.var_tg_token.get().strip(),
             telegram_chat_id=self.var_tg_chat.get().strip(),
+            telegram_coalesce_ms=self.cfg.telegram_coalesce_ms,
+            telegram_coalesce_max=self.cfg.telegram_coalesce_max,
 
             enable_dingtalk=bool(self.var_dt_on.get()),
             dingtalk_webhook=self.var_dt_webhook.get().strip(),
@@ -805,8 +876,30 @@ class App(tb.Window):
             smtp_pass=self.var_smtp_pass.get().strip(),
             email_to=self.var_email_to.get().strip(),
             email_from=self.var_email_from.get().strip(),
+            email_digest_enabled=bool(self.var_mail_digest.get()),
+            email_digest_seconds=self.safe_int(self.var_mail_digest_sec.get(), 300),
+            email_digest_max_items=self.cfg.email_digest_max_items,
 
             dedup_seconds=self.safe_int(self.var_dedup.get(), 8),
+            dedup_max_entries=self.cfg.dedup_max_entries,
+            dedup_cross_adapter=bool(self.var_dedup_cross.get()),
+            delivery_queue_size=self.cfg.delivery_queue_size,
+            delivery_deadline_seconds=self.cfg.delivery_deadline_seconds,
+            outbox_enabled=self.cfg.outbox_enabled,
+            outbox_max_age_hours=self.cfg.outbox_max_age_hours,
+            outbox_retry_seconds=self.cfg.outbox_retry_seconds,
+            retry_max=self.cfg.retry_max,
+            retry_base_seconds=self.cfg.retry_base_seconds,
+            retry_max_delay_seconds=self.cfg.retry_max_delay_seconds,
+            breaker_threshold=self.cfg.breaker_threshold,
+            breaker_cooldown_seconds=self.cfg.breaker_cooldown_seconds,
+            telegram_rate_per_min=self.cfg.telegram_rate_per_min,
+            dingtalk_rate_per_min=self.cfg.dingtalk_rate_per_min,
+            gotify_rate_per_min=self.cfg.gotify_rate_per_min,
+            email_rate_per_min=self.cfg.email_rate_per_min,
+            rate_burst=self.cfg.rate_burst,
+            http_pool_size=self.cfg.http_pool_size,
+            http_idle_seconds=self.cfg.http_idle_seconds,
 
             block_keywords=blocks,
             block_case_insensitive=bool(self.var_block_ci.get()),
@@ -814,12 +907,19 @@ class App(tb.Window):
             enable_code_highlight=bool(self.var_code_on.get()),
             code_send_separately=bool(self.var_code_sep.get()),
             code_regex=self.cfg.code_regex,
+            code_patterns=self.cfg.code_patterns,
+            code_app_rules=self.cfg.code_app_rules,
             code_separate_prefix=self.cfg.code_separate_prefix,
+            routes=self.cfg.routes,
 
             history_limit=self.safe_int(self.var_history_limit.get(), self.cfg.history_limit),
             autostart_enabled=self.cfg.autostart_enabled,
 
             show_battery_in_message=bool(self.var_show_battery.get()),
+            battery_refresh_seconds=self.cfg.battery_refresh_seconds,
+            metrics_enabled=self.cfg.metrics_enabled,
+            metrics_bind=self.cfg.metrics_bind,
+            metrics_port=self.cfg.metrics_port,
             enable_windows_toast=bool(self.var_win_toast.get()),
         )
 
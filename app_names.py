@@ -0,0 +1,107 @@
+# app_names.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# ANCS AppAttributeID
+APP_ATTR_DISPLAY_NAME = 0
+
+
+def app_attributes_request(app_id: str) -> bytes:
+    """GetAppAttributes (command 1) asking for the display name."""
+    return b"\x01" + app_id.encode("utf-8") + b"\x00" + bytes([APP_ATTR_DISPLAY_NAME])
+
+
+class AppNameCache:
+    """
+    Bundle ID -> display name, least recently used entries evicted first.
+
+    Loaded once at startup and written back (atomically, a few seconds after
+    the last change and on close) so names survive restarts and the phone is
+    asked at most once per app. An empty name is cached too: the phone had
+    nothing for that app, so there is no point asking again.
+    """
+
+    def __init__(self, path: str, max_entries: int = 512, log: Optional[Callable[[str], None]] = None,
+                 save_delay: float = 5.0):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.log = log
+        self.save_delay = float(save_delay)
+        self._names: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+
+    def load(self) -> int:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            if self.log:
+                self.log(f"[APPNAME] load failed: {e}")
+            return 0
+        with self._lock:
+            for app, name in (data or {}).items():
+                self._names[str(app)] = str(name or "")
+            while len(self._names) > self.max_entries:
+                self._names.popitem(last=False)
+            return len(self._names)
+
+    def get(self, app: str) -> Optional[str]:
+        """Display name, "" if the phone has none, None if not fetched yet."""
+        with self._lock:
+            name = self._names.get(app)
+            if name is not None:
+                self._names.move_to_end(app)
+            return name
+
+    def put(self, app: str, name: str):
+        if not app:
+            return
+        with self._lock:
+            if self._names.get(app) == name:
+                self._names.move_to_end(app)
+                return
+            self._names[app] = name
+            self._names.move_to_end(app)
+            while len(self._names) > self.max_entries:
+                self._names.popitem(last=False)
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.save_delay, self.save)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def save(self):
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return
+            data = dict(self._names)
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            if self.log:
+                self.log(f"[APPNAME] save failed: {e}")
+
+    def close(self):
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.save()
@@ -0,0 +1,84 @@
+# benchmarks/bench_codes.py
+# -*- coding: utf-8 -*-
+"""
+Code extraction time per notification.
+
+    python benchmarks/bench_codes.py [--n 50000]
+
+Baseline is the old path (re.findall(code_regex) over app/title/msg/date
+merged); CodeExtractor searches title + message only, with per-app rules and
+a no-digit fast path.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codes import CodeExtractor  # noqa: E402
+
+CODE_REGEX = r"\b\d{4,8}\b"
+
+SAMPLES = [
+    ("com.tencent.xin", "张三", "晚上一起吃饭吗？🍜"),
+    ("com.tencent.xin", "工作群", "收到，明天上午开会 👍"),
+    ("jp.naver.line", "田中", "了解です！またね〜"),
+    ("com.apple.MobileSMS", "10690000", "【某银行】您的验证码为 482913，5分钟内有效，请勿泄露。"),
+    ("com.apple.MobileSMS", "Apple", "Your Apple ID code is: 615203. Don't share it with anyone."),
+    ("com.icbc.iphone", "工商银行", "您尾号1234的账户于2026年03月05日支出 88.00 元，验证码 739104"),
+    ("com.burbn.instagram", "", "someone liked your photo ❤️"),
+    ("com.google.Gmail", "Weekly digest", "Your summary for week 12 of 2026 is ready"),
+]
+
+
+def make_stream(n: int, seed: int = 2):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        app, title, msg = rnd.choice(SAMPLES)
+        out.append((app, title, msg, f"20260305T{rnd.randint(0, 23):02d}{rnd.randint(0, 59):02d}00"))
+    return out
+
+
+def bench(fn, stream) -> float:
+    t0 = time.perf_counter_ns()
+    for item in stream:
+        fn(*item)
+    return (time.perf_counter_ns() - t0) / len(stream)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50_000)
+    args = ap.parse_args(argv)
+    stream = make_stream(args.n)
+
+    def legacy(app, title, msg, date):
+        merged = "\n".join([app, title, msg, date]).strip()
+        return re.findall(CODE_REGEX, merged)
+
+    plain = CodeExtractor(CODE_REGEX)
+    ruled = CodeExtractor(CODE_REGEX, app_rules={"com.apple.MobileSMS": "keyword", "com.icbc.*": "keyword"})
+
+    rows = [
+        ("legacy findall", bench(legacy, stream)),
+        ("extractor default", bench(lambda a, t, m, d: plain.extract(a, t, m), stream)),
+        ("extractor + rules", bench(lambda a, t, m, d: ruled.extract(a, t, m), stream)),
+    ]
+    for name, ns in rows:
+        print(f"{name:<18} {ns:>8.0f} ns/notification")
+
+    print("\nsample results (legacy -> rules):")
+    for app, title, msg in SAMPLES:
+        date = "20260305T120000"
+        print(f"  {app:<22} {legacy(app, title, msg, date)!s:<28} {ruled.extract(app, title, msg)}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_ds_parser.py
+# -*- coding: utf-8 -*-
+"""
+Data Source parse throughput on synthetic chunked streams.
+
+    python benchmarks/bench_ds_parser.py [--n 20000]
+
+Each stream is a run of GetNotificationAttributes responses cut into chunks
+of a fixed size (20 = default ATT MTU, 182/244 = common negotiated MTUs).
+The baseline is the old _try_parse_ds (re-slice from offset 5 per chunk,
+reset the buffer after each response); it is fed one response at a time
+because it cannot parse responses back to back.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ancs_parser import DataSourceParser  # noqa: E402
+
+CHUNK_SIZES = (20, 182, 244)
+
+
+def _attr(attr_id: int, text: str) -> bytes:
+    b = text.encode("utf-8")
+    return bytes([attr_id]) + len(b).to_bytes(2, "little") + b
+
+
+def make_responses(n: int, seed: int = 3) -> List[bytes]:
+    rnd = random.Random(seed)
+    apps = ["com.tencent.xin", "com.apple.MobileSMS", "jp.naver.line", "com.icbc.iphone"]
+    out = []
+    for uid in range(n):
+        msg = "你好，消息内容 message body 🐾 " * rnd.randint(1, 8)
+        out.append(
+            b"\x00" + uid.to_bytes(4, "little")
+            + _attr(0, rnd.choice(apps))
+            + _attr(1, f"群聊 {rnd.randint(1, 50)}")
+            + _attr(3, msg.encode("utf-8")[:256].decode("utf-8", "ignore"))
+            + _attr(5, "20260305T120000")
+        )
+    return out
+
+
+def chunked(data: bytes, size: int) -> List[bytearray]:
+    return [bytearray(data[i: i + size]) for i in range(0, len(data), size)]
+
+
+class LegacyParser:
+    """The pre-DataSourceParser implementation, kept here as the baseline."""
+
+    def __init__(self):
+        self._ds_buf = bytearray()
+        self.responses = 0
+
+    def feed(self, chunk):
+        self._ds_buf += chunk
+        self._try_parse_ds()
+
+    def _try_parse_ds(self):
+        if len(self._ds_buf) < 5:
+            return
+        if self._ds_buf[0] != 0x00:
+            self._ds_buf = bytearray()
+            return
+        int.from_bytes(self._ds_buf[1:5], "little", signed=False)
+        pos = 5
+        attrs: Dict[int, str] = {}
+        while True:
+            if len(self._ds_buf) < pos + 3:
+                return
+            attr_id = self._ds_buf[pos]
+            attr_len = int.from_bytes(self._ds_buf[pos + 1: pos + 3], "little", signed=False)
+            pos += 3
+            if len(self._ds_buf) < pos + attr_len:
+                return
+            raw = bytes(self._ds_buf[pos: pos + attr_len])
+            pos += attr_len
+            attrs[attr_id] = raw.decode("utf-8", errors="ignore")
+            if pos >= len(self._ds_buf):
+                break
+        self._ds_buf = bytearray()
+        self.responses += 1
+
+
+def run_legacy(responses: List[bytes], size: int):
+    streams = [chunked(r, size) for r in responses]
+    p = LegacyParser()
+    t0 = time.perf_counter_ns()
+    for chunks in streams:
+        for c in chunks:
+            p.feed(c)
+    return time.perf_counter_ns() - t0, p.responses
+
+
+def run_parser(responses: List[bytes], size: int):
+    chunks = chunked(b"".join(responses), size)
+    p = DataSourceParser(lambda r: None, attr_counts={0: 4, 1: 1})
+    t0 = time.perf_counter_ns()
+    for c in chunks:
+        p.feed(c)
+    return time.perf_counter_ns() - t0, p.responses
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20_000)
+    args = ap.parse_args(argv)
+
+    responses = make_responses(args.n)
+    total = sum(len(r) for r in responses)
+    rows = []
+    for size in CHUNK_SIZES:
+        for name, fn in (("legacy", run_legacy), ("DataSourceParser", run_parser)):
+            ns, count = fn(responses, size)
+            rows.append({
+                "name": name,
+                "chunk": size,
+                "mb_s": total / (ns / 1e9) / 1e6,
+                "us_per_response": ns / 1000 / max(1, count),
+                "responses": count,
+            })
+    for r in rows:
+        print(f"chunk={r['chunk']:<4} {r['name']:<17} {r['mb_s']:>7.1f} MB/s  "
+              f"{r['us_per_response']:>6.2f} us/response  responses={r['responses']}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_e2e.py
+# -*- coding: utf-8 -*-
+"""
+End-to-end run of BridgeManager against fake ANCS phones (no Bluetooth).
+
+    python benchmarks/bench_e2e.py [--phones 1] [--mtu 185] [--drop 0.0]
+                                   [--scenario steps.json] [--max-loss 0]
+
+Latency is measured from the phone raising a notification to the manager's
+on_notification callback (all destinations are disabled, so nothing leaves
+the machine). Exits with status 1 when more than --max-loss notifications
+are lost, so the script can gate CI.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ancs_bridge  # noqa: E402
+from fake_ancs import FakePhone, patch_bleak, run_scenario  # noqa: E402
+
+DEFAULT_SCENARIO = [
+    {"op": "wait_connected", "timeout": 10},
+    {"op": "burst", "count": 50, "msg_len": 120},
+    {"op": "sleep", "seconds": 1.0},
+    {"op": "disconnect", "down_seconds": 1.0},
+    {"op": "burst", "count": 10, "msg_len": 60},
+    {"op": "wait_connected", "timeout": 15},
+    {"op": "burst", "count": 50, "msg_len": 600},
+]
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--phones", type=int, default=1)
+    ap.add_argument("--mtu", type=int, default=185)
+    ap.add_argument("--drop", type=float, default=0.0, help="fraction of Data Source responses never sent")
+    ap.add_argument("--scenario", help="JSON file with a list of scenario steps")
+    ap.add_argument("--settle", type=float, default=10.0, help="seconds to wait for stragglers")
+    ap.add_argument("--max-loss", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    steps = DEFAULT_SCENARIO
+    if args.scenario:
+        with open(args.scenario, "r", encoding="utf-8") as f:
+            steps = json.load(f)
+
+    phones = [
+        FakePhone(f"FA:KE:00:00:00:{i + 1:02X}", mtu=args.mtu, drop_rate=args.drop, seed=i,
+                  app_names={"com.tencent.xin": "微信"})
+        for i in range(args.phones)
+    ]
+    cfg = ancs_bridge.BridgeConfig(
+        ble_addresses=[p.address for p in phones],
+        enable_telegram=False,
+        enable_windows_toast=False,
+        outbox_enabled=False,
+        ancs_cp_timeout_seconds=1.0,
+        reconnect_base_seconds=0.2,
+        reconnect_max_seconds=2.0,
+    )
+
+    received = {}  # (address, uid) -> arrival time (monotonic)
+    lock = threading.Lock()
+
+    def on_notification(payload: dict):
+        if payload.get("full_message"):
+            return
+        now = time.monotonic()
+        with lock:
+            received.setdefault((payload["device"], payload["uid"]), now)
+
+    data_dir = tempfile.mkdtemp(prefix="nekolink-e2e-")
+    with patch_bleak(ancs_bridge, phones):
+        manager = ancs_bridge.BridgeManager(cfg, lambda s: None, on_notification, data_dir=data_dir)
+        manager.start_all(cfg.ble_addresses)
+        t0 = time.monotonic()
+        runners = [threading.Thread(target=run_scenario, args=(p, steps)) for p in phones]
+        for r in runners:
+            r.start()
+        for r in runners:
+            r.join()
+
+        deadline = time.monotonic() + args.settle
+        total = sum(len(p.notifications) for p in phones)
+        while time.monotonic() < deadline and len(received) < total:
+            time.sleep(0.05)
+        elapsed = time.monotonic() - t0
+        conn = manager.connection_stats()
+        manager.shutdown(timeout=2.0)
+
+    posted_at = {(p.address, uid): n.posted for p in phones for uid, n in p.notifications.items()}
+    lat = [(t - posted_at[k]) * 1000 for k, t in received.items() if k in posted_at]
+    lost = total - len(received)
+    print(f"phones={args.phones} mtu={args.mtu} drop={args.drop} posted={total} "
+          f"received={len(received)} lost={lost} elapsed={elapsed:.2f}s")
+    print(f"latency ms: p50={percentile(lat, 50):.1f} p95={percentile(lat, 95):.1f} max={max(lat or [0]):.1f}")
+    for p in phones:
+        st = conn.get(p.address, {})
+        print(f"  {p.address}: cp_writes={p.stats['cp_writes']} responses={p.stats['responses']} "
+              f"dropped={p.stats['dropped']} reconnects={st.get('reconnects')} "
+              f"last_reconnect={st.get('last_reconnect_s')}s")
+    return 1 if lost > args.max_loss else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+# benchmarks/bench_hotpath.py
+# -*- coding: utf-8 -*-
+"""
+Per-notification cost of every step on the hot path.
+
+    python benchmarks/bench_hotpath.py [--n 20000] [--out FILE] [--compare FILE]
+
+Steps: Data Source parsing, block keywords and code extraction (the live
+KeywordBlocker / CodeExtractor next to the pre-compilation baselines kept in
+this module), the dedup gate (BridgeManager._accept), routing, message
+formatting and the GUI history row insert (skipped when Tk or ttkbootstrap is
+not available). For each step it records ns per
+notification (best of --repeat runs), the transient allocation peak per call
+and the memory blocks still held afterwards, per notification.
+
+Results are written to benchmarks/results/hotpath-<commit>.json by default;
+--compare prints the change against an earlier results file.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ancs_bridge  # noqa: E402
+from ancs_parser import DataSourceParser  # noqa: E402
+from codes import CodeExtractor  # noqa: E402
+from routing import Router  # noqa: E402
+
+APPS = [
+    ("com.tencent.xin", "微信"),
+    ("com.apple.MobileSMS", "信息"),
+    ("jp.naver.line", "LINE"),
+    ("com.icbc.iphone", "工商银行"),
+    ("com.burbn.instagram", "Instagram"),
+    ("com.taobao.taobao4iphone", "淘宝"),
+]
+TITLES = ["张三", "工作群 👥", "田中さん", "10690000", "Apple", "家人 ❤️", "【淘宝】双11预售", "Weekly digest"]
+BODIES = [
+    "晚上一起吃饭吗？🍜 我在老地方等你",
+    "收到，明天上午十点开会 👍 记得带电脑",
+    "了解です！またね〜 🎌 明日の会議は10時からです",
+    "【某银行】您的验证码为 482913，5分钟内有效，请勿泄露。",
+    "Your Apple ID code is: 615203. Don't share it with anyone.",
+    "您尾号1234的账户于03月05日支出 88.00 元，余额 1,024.50 元",
+    "someone liked your photo ❤️🔥",
+    "限时优惠！全场满300减50 🎁 点击领取 https://example.com/x",
+    "[图片] [语音] 😂😂😂 哈哈哈哈哈哈哈哈哈哈",
+]
+KEYWORDS = [
+    "广告", "优惠", "促销", "领取", "红包雨", "双11", "秒杀", "退订", "满减", "直播",
+    "app:com.taobao", "app:com.jingdong", "title:【淘宝】", "title:推广", "msg:点击领取",
+    "unsubscribe", "promotion", "SALE", "セール", "キャンペーン",
+]
+ROUTES = [
+    {"has_code": True, "to": ["telegram"]},
+    {"app": "com.icbc.*", "to": ["email"]},
+    {"app": "com.tencent.xin", "keyword": "title:工作", "to": ["telegram", "gotify"]},
+    {"app": "com.tencent.xin", "to": ["gotify"]},
+]
+
+
+def block_baseline(text: str, keywords: List[str]) -> bool:
+    """The original check: lowercase the merged text and try each keyword in turn."""
+    hay = (text or "").lower()
+    return any(k.lower() in hay for k in keywords if k)
+
+
+def codes_baseline(text: str, regex: str) -> List[str]:
+    """The original extraction: one re.findall over the merged text, pattern compiled per call."""
+    return re.findall(regex, text or "")
+
+
+def make_payloads(n: int, seed: int = 7) -> List[dict]:
+    rnd = random.Random(seed)
+    extractor = CodeExtractor(r"\b\d{4,8}\b")
+    out: List[dict] = []
+    for i in range(n):
+        if out and rnd.random() < 0.2:
+            out.append(dict(out[-rnd.randint(1, min(5, len(out)))]))  # a repeat
+            continue
+        app, name = rnd.choice(APPS)
+        title = rnd.choice(TITLES)
+        msg = rnd.choice(BODIES) * rnd.randint(1, 3)
+        out.append({
+            "ts": time.time(),
+            "uid": i,
+            "device": rnd.choice(["62:56:29:71:36:67", "A4:C1:38:00:11:22"]),
+            "battery": rnd.randint(5, 100),
+            "app": app,
+            "app_name": name,
+            "title": title,
+            "msg": msg,
+            "date": f"20260305T{rnd.randint(0, 23):02d}{rnd.randint(0, 59):02d}00",
+            "codes": extractor.extract(app, title, msg),
+        })
+    return out
+
+
+def _attr(attr_id: int, text: str, limit: int = 0) -> bytes:
+    b = text.encode("utf-8")
+    if limit:
+        b = b[:limit].decode("utf-8", "ignore").encode("utf-8")
+    return bytes([attr_id]) + len(b).to_bytes(2, "little") + b
+
+
+def make_ds_chunks(payloads: List[dict], mtu: int = 185) -> List[List[bytearray]]:
+    """Each notification as the Data Source chunks it arrives in."""
+    step = mtu - 3
+    out = []
+    for p in payloads:
+        resp = (
+            b"\x00" + int(p["uid"]).to_bytes(4, "little")
+            + _attr(0, p["app"]) + _attr(1, p["title"], 64) + _attr(3, p["msg"], 256)
+            + _attr(4, str(len(p["msg"]))) + _attr(5, p["date"])
+        )
+        out.append([bytearray(resp[i: i + step]) for i in range(0, len(resp), step)])
+    return out
+
+
+def gui_step() -> Optional[Callable[[dict], None]]:
+    """The real App.on_notification bound to a minimal widget set, or None without a display."""
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+
+        import app_gui
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as e:
+        print(f"gui row insert: skipped ({type(e).__name__}: {e})")
+        return None
+    cols = ("time", "device", "battery", "app", "title", "msg", "codes")
+    stub = types.SimpleNamespace(
+        preview=tk.Text(root),
+        tree=ttk.Treeview(root, columns=cols, show="headings"),
+        var_history_limit=tk.StringVar(value="300"),
+        safe_int=app_gui.App.safe_int,
+        cfg=ancs_bridge.BridgeConfig(),
+        _rows={},
+    )
+
+    def step(p: dict):
+        app_gui.App.on_notification(stub, p)
+        root.update_idletasks()
+
+    return step
+
+
+def build_steps(payloads: List[dict]) -> Dict[str, tuple]:
+    cfg = ancs_bridge.BridgeConfig(
+        block_keywords=KEYWORDS, routes=ROUTES, enable_telegram=False, outbox_enabled=False,
+    )
+    blocker = ancs_bridge._compile_blocker(cfg.block_keywords, cfg.block_case_insensitive)
+    codes = ancs_bridge._compile_codes(cfg)
+    router = Router(cfg.routes)
+    manager = ancs_bridge.BridgeManager(cfg, lambda s: None, lambda p: None)
+    merged = ["\n".join([p["app"], p["title"], p["msg"], p["date"]]) for p in payloads]
+
+    parser = DataSourceParser(lambda r: None, attr_counts={0: 5, 1: 1})
+    chunks = make_ds_chunks(payloads)
+
+    def parse(i: int):
+        for c in chunks[i]:
+            parser.feed(c)
+
+    def block(p: dict) -> bool:
+        # as in _ANCSSession._emit_notification: the display name is matched with the bundle ID
+        app_text = f"{p['app']}\n{p['app_name']}" if p["app_name"] else p["app"]
+        return blocker.is_blocked(app_text, p["title"], p["msg"], p["date"])
+
+    steps = {
+        "ds_parse": (parse, list(range(len(payloads)))),
+        "block_baseline": (lambda t: block_baseline(t, cfg.block_keywords), merged),
+        "block": (block, payloads),
+        "codes_baseline": (lambda t: codes_baseline(t, cfg.code_regex), merged),
+        "codes": (lambda p: codes.extract(p["app"], p["title"], p["msg"]), payloads),
+        "accept": (
+            lambda p: manager._accept(p["device"], p["uid"], p["app"], p["title"], p["msg"], p["date"]),
+            payloads),
+        "route": (router.route, payloads),
+        "format_message": (lambda p: ancs_bridge._format_message(p, cfg), payloads),
+    }
+    gui = gui_step()
+    if gui is not None:
+        steps["gui_row_insert"] = (gui, payloads)
+    return steps
+
+
+def measure(fn: Callable, items: list, repeat: int, mem_samples: int) -> Dict[str, float]:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        for x in items:
+            fn(x)
+        dt = time.perf_counter_ns() - t0
+        best = dt if best is None else min(best, dt)
+
+    # memory separately: tracemalloc slows everything down
+    gc.collect()
+    blocks0 = sys.getallocatedblocks()
+    for x in items:
+        fn(x)
+    gc.collect()
+    retained = (sys.getallocatedblocks() - blocks0) / len(items)
+
+    tracemalloc.start()
+    peak_total = 0
+    sample = items[:: max(1, len(items) // mem_samples)]
+    for x in sample:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(x)
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {
+        "ns_per_notification": best / len(items),
+        "peak_bytes_per_call": peak_total / len(sample),
+        "retained_blocks_per_notification": retained,
+    }
+
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "*.py"], cwd=ROOT) != 0
+        return sha + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--mem-samples", type=int, default=500)
+    ap.add_argument("--out", help="results file (default benchmarks/results/hotpath-<commit>.json)")
+    ap.add_argument("--compare", help="earlier results file to diff against")
+    args = ap.parse_args(argv)
+
+    payloads = make_payloads(args.n)
+    results = {}
+    for name, (fn, items) in build_steps(payloads).items():
+        results[name] = measure(fn, items, args.repeat, args.mem_samples)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "n": args.n,
+            "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("results", {})
+
+    print(f"{'step':<22} {'ns/notif':>10} {'peak B/call':>12} {'kept blocks':>12}")
+    for name, r in results.items():
+        line = (f"{name:<22} {r['ns_per_notification']:>10.0f} {r['peak_bytes_per_call']:>12.0f} "
+                f"{r['retained_blocks_per_notification']:>12.3f}")
+        old = previous.get(name)
+        if old and old.get("ns_per_notification"):
+            change = (r["ns_per_notification"] / old["ns_per_notification"] - 1) * 100
+            line += f"   {change:+.1f}% vs {os.path.basename(args.compare)}"
+        print(line)
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"hotpath-{commit}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nsaved {out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
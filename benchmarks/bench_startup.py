@@ -0,0 +1,166 @@
+# benchmarks/bench_startup.py
+# -*- coding: utf-8 -*-
+"""
+Cold-start time of the GUI and the headless service, each in a fresh process.
+
+    python benchmarks/bench_startup.py [--runs 5] [--gui-budget-ms N]
+                                       [--service-budget-ms N] [--out FILE] [--compare FILE]
+
+gui:     process start -> `import app_gui` -> App() built -> first paint (update()).
+service: process start -> `import nekolink_service` -> BridgeManager.start_all()
+         -> the session's first BLE connect attempt.
+
+Each run also lists which deferred modules (bleak, requests, smtplib, winsdk,
+PIL, pystray, ...) were already loaded at that point; any of them showing up
+counts as a regression. Both children use an empty config in a temp folder,
+so the user's settings never affect the numbers. Medians are written to
+benchmarks/results/startup-<commit>.json; exits 1 when a budget is exceeded
+or a deferred module was loaded early.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_hotpath import git_commit  # noqa: E402
+
+# must not be imported before the first paint / first connect
+DEFERRED = {
+    "gui": ["bleak", "requests", "smtplib", "http.server", "winsdk", "PIL", "pystray"],
+    "service": ["tkinter", "ttkbootstrap", "PIL", "pystray", "requests", "smtplib", "http.server", "winsdk"],
+}
+
+CHILD = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, ROOT)
+out = {}
+
+def rss_kb():
+    try:
+        import resource
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r // 1024 if sys.platform == "darwin" else r
+    except Exception:
+        return None
+
+def done(**kw):
+    out.update(kw)
+    out["loaded"] = [m for m in DEFERRED if m in sys.modules]
+    out["rss_kb"] = rss_kb()
+    print("RESULT " + json.dumps(out), flush=True)
+    os._exit(0)
+
+if MODE == "gui":
+    try:
+        import app_gui
+    except Exception as e:
+        done(skipped=f"{type(e).__name__}: {e}")
+    out["import_ms"] = (time.perf_counter() - t0) * 1000
+    try:
+        app = app_gui.App()
+        app.update()
+    except Exception as e:
+        done(skipped=f"{type(e).__name__}: {e}")
+    done(ready_ms=(time.perf_counter() - t0) * 1000)
+else:
+    import threading
+    import nekolink_service
+    import ancs_bridge
+    out["import_ms"] = (time.perf_counter() - t0) * 1000
+    first = threading.Event()
+
+    def log(s):
+        if "connecting..." in s and not first.is_set():
+            out["ready_ms"] = (time.perf_counter() - t0) * 1000
+            first.set()
+
+    cfg = ancs_bridge.BridgeConfig(ble_addresses=["00:00:00:00:00:01"], enable_telegram=False)
+    ancs_bridge.BridgeManager(cfg, log, lambda p: None).start_all(cfg.ble_addresses)
+    if not first.wait(30):
+        done(skipped="no connect attempt within 30s")
+    done()
+"""
+
+
+def run_child(mode: str) -> dict:
+    cfg_dir = tempfile.mkdtemp(prefix="nekolink-startup-")
+    env = dict(os.environ, APPDATA=cfg_dir, NEKOLINK_PORTABLE="0")
+    code = f"ROOT = {ROOT!r}\nMODE = {mode!r}\nDEFERRED = {DEFERRED[mode]!r}\n" + CHILD
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=cfg_dir, env=env,
+                          capture_output=True, text=True, timeout=120)
+    wall = (time.perf_counter() - t0) * 1000
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            r = json.loads(line[7:])
+            r["wall_ms"] = wall
+            return r
+    return {"skipped": (proc.stderr.strip().splitlines() or ["no result"])[-1]}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--modes", default="gui,service")
+    ap.add_argument("--gui-budget-ms", type=float, help="fail when median start -> first paint exceeds this")
+    ap.add_argument("--service-budget-ms", type=float, help="fail when median start -> first connect exceeds this")
+    ap.add_argument("--out", help="results file (default benchmarks/results/startup-<commit>.json)")
+    ap.add_argument("--compare", help="earlier results file to diff against")
+    args = ap.parse_args(argv)
+
+    budgets = {"gui": args.gui_budget_ms, "service": args.service_budget_ms}
+    previous = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("results", {})
+
+    results = {}
+    failed = False
+    print(f"{'mode':<8} {'import ms':>10} {'ready ms':>10} {'wall ms':>10} {'max rss KB':>11}  early imports")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        runs = [run_child(mode) for _ in range(args.runs)]
+        ok = [r for r in runs if "skipped" not in r]
+        if not ok:
+            print(f"{mode:<8} skipped ({runs[0].get('skipped')})")
+            continue
+        med = {k: statistics.median(r[k] for r in ok if r.get(k) is not None)
+               for k in ("import_ms", "ready_ms", "wall_ms", "rss_kb") if any(r.get(k) is not None for r in ok)}
+        loaded = sorted({m for r in ok for m in r.get("loaded", [])})
+        med["loaded"] = loaded
+        results[mode] = med
+
+        line = (f"{mode:<8} {med.get('import_ms', 0):>10.1f} {med.get('ready_ms', 0):>10.1f} "
+                f"{med.get('wall_ms', 0):>10.1f} {med.get('rss_kb', 0):>11.0f}  {', '.join(loaded) or '-'}")
+        old = previous.get(mode)
+        if old and old.get("ready_ms"):
+            line += f"   {(med['ready_ms'] / old['ready_ms'] - 1) * 100:+.1f}% vs {os.path.basename(args.compare)}"
+        print(line)
+        if loaded:
+            failed = True
+        if budgets.get(mode) is not None and med.get("ready_ms", 0) > budgets[mode]:
+            print(f"  over budget: {med['ready_ms']:.1f} ms > {budgets[mode]:.1f} ms")
+            failed = True
+
+    commit = git_commit()
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"startup-{commit}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"meta": {"commit": commit, "python": sys.version.split()[0], "runs": args.runs,
+                            "when": time.strftime("%Y-%m-%dT%H:%M:%S")}, "results": results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\nsaved {out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# benchmarks/check_delivery.py
+# -*- coding: utf-8 -*-
+"""
+Scripted checks for the delivery stage (no network, no Bluetooth).
+
+    python benchmarks/check_delivery.py [-k NAME]
+
+Each check drives DeliveryPipeline / BridgeManager with fake senders through
+one failure sequence and asserts the outcome. Exits 1 if any check fails.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ancs_bridge  # noqa: E402
+from delivery import CircuitBreaker, DeliveryPipeline, RateLimited, RetryPolicy, is_transient_error  # noqa: E402
+from outbox import Outbox  # noqa: E402
+
+CHECKS: Dict[str, Callable[[], None]] = {}
+
+
+def check(fn):
+    CHECKS[fn.__name__.replace("check_", "")] = fn
+    return fn
+
+
+def _wait(cond: Callable[[], bool], timeout: float = 5.0):
+    end = time.time() + timeout
+    while time.time() < end and not cond():
+        time.sleep(0.01)
+
+
+def _probe_sequence(probe_error: Exception):
+    """ConnectionError opens the breaker; the half-open probe gets probe_error; later sends must go out."""
+    policy = RetryPolicy(retry_max=0, base_seconds=0.01, breaker_threshold=1, breaker_cooldown_seconds=0.2)
+    pipeline = DeliveryPipeline(lambda s: None, policy=policy)
+    sent: List[str] = []
+    outcomes = [ConnectionError("down"), probe_error]
+
+    def send(name: str):
+        def step(_timeout: float):
+            if outcomes:
+                raise outcomes.pop(0)
+            sent.append(name)
+        return [(name, step)]
+
+    pipeline.submit("gotify", send("first"), 30)
+    _wait(lambda: pipeline.stats()["gotify"]["breaker"] == CircuitBreaker.OPEN)
+    time.sleep(0.25)
+    pipeline.submit("gotify", send("probe"), 30)
+    _wait(lambda: not outcomes and pipeline.depths()["gotify"] == 0)
+    pipeline.submit("gotify", send("after"), 30)
+    _wait(lambda: "after" in sent)
+    state = pipeline.stats()["gotify"]["breaker"]
+    pipeline.close(1.0)
+    assert "after" in sent, f"send after the probe was skipped (breaker {state})"
+    assert state == CircuitBreaker.CLOSED, state
+
+
+@check
+def check_probe_rate_limited():
+    _probe_sequence(RateLimited(0.0))
+
+
+@check
+def check_probe_permanent_error():
+    _probe_sequence(ValueError("HTTP 400"))
+
+
+@check
+def check_http_5xx_is_transient():
+    for status, transient in ((502, True), (500, True), (408, True), (400, False), (401, False)):
+        resp = types.SimpleNamespace(status_code=status, text="x", headers={}, json=lambda: {})
+        saved = ancs_bridge.HTTP_POOL.post
+        ancs_bridge.HTTP_POOL.post = lambda *a, **k: resp
+        try:
+            for send in (
+                lambda: ancs_bridge.send_gotify("http://gotify", "t", "title", "msg"),
+                lambda: ancs_bridge.send_dingtalk_text("http://ding?x=1", "", "msg"),
+            ):
+                try:
+                    send()
+                except Exception as e:
+                    assert is_transient_error(e) == transient, (status, repr(e))
+                else:
+                    raise AssertionError(f"HTTP {status} did not raise")
+        finally:
+            ancs_bridge.HTTP_POOL.post = saved
+
+
+@check
+def check_smtp_errors():
+    assert is_transient_error(smtplib.SMTPServerDisconnected("Connection unexpectedly closed"))
+    assert is_transient_error(smtplib.SMTPResponseException(421, b"try later"))
+    assert not is_transient_error(smtplib.SMTPAuthenticationError(535, b"bad login"))
+    assert not is_transient_error(smtplib.SMTPRecipientsRefused({}))
+
+
+@check
+def check_replay_keeps_order():
+    """30 rows left in the outbox, queue size 10: replayed oldest first, nothing evicted."""
+    data_dir = tempfile.mkdtemp(prefix="nekolink-check-")
+    ob = Outbox(os.path.join(data_dir, "outbox.db"), lambda s: None)
+    for i in range(1, 31):
+        ob.put("gotify", {"tag": "GOTIFY", "kind": "gotify", "text": f"msg{i}"})
+    ob.close()
+
+    logs: List[str] = []
+    sent: List[str] = []
+    lock = threading.Lock()
+    cfg = ancs_bridge.BridgeConfig(
+        enable_telegram=False, enable_windows_toast=False, enable_gotify=True,
+        gotify_rate_per_min=0, delivery_queue_size=10,
+    )
+    manager = ancs_bridge.BridgeManager(cfg, logs.append, lambda p: None, data_dir=data_dir)
+
+    def fake_send(spec: dict, timeout: float):
+        time.sleep(0.005)
+        with lock:
+            sent.append(spec["text"])
+
+    manager._send_spec = fake_send
+    manager._get_outbox()
+    _wait(lambda: len(sent) >= 30 and manager.outbox_depth() == 0, timeout=10)
+    manager.shutdown(timeout=1.0)
+    dropped = [line for line in logs if "[QUEUE]" in line]
+    assert not dropped, f"{len(dropped)} jobs evicted"
+    assert sent == [f"msg{i}" for i in range(1, 31)], sent
+
+
+@check
+def check_telegram_batch_parts():
+    """A merged batch over 4096 chars is one outbox row per part; a 429 on part 2 does not resend part 1."""
+    data_dir = tempfile.mkdtemp(prefix="nekolink-check-")
+    cfg = ancs_bridge.BridgeConfig(
+        enable_telegram=True, enable_windows_toast=False, telegram_coalesce_ms=50, telegram_coalesce_max=10,
+        telegram_rate_per_min=0,
+    )
+    manager = ancs_bridge.BridgeManager(cfg, lambda s: None, lambda p: None, data_dir=data_dir)
+    sent: List[str] = []
+    rows: List[int] = []
+    fail = [RateLimited(0.05)]
+    put = manager._get_outbox().put
+
+    def counting_put(dest, spec):
+        rows.append(1)
+        return put(dest, spec)
+
+    def fake_send(spec: dict, timeout: float):
+        if len(sent) == 1 and fail:
+            raise fail.pop()
+        sent.append(spec["text"])
+
+    manager._get_outbox().put = counting_put
+    manager._send_spec = fake_send
+    for i in range(3):
+        manager._forward({"app": "com.example", "title": f"t{i}", "msg": str(i) * 2000, "ts": time.time()})
+    _wait(lambda: len(sent) >= len(rows) > 1 and manager.outbox_depth() == 0)
+    manager.shutdown(timeout=1.0)
+    assert len(rows) > 1, "batch was not split"
+    assert len(sent) == len(rows) == len(set(sent)), (len(sent), len(rows))
+    assert all(ancs_bridge._tg_len(t) <= ancs_bridge.TELEGRAM_MAX_LEN for t in sent)
+
+
+@check
+def check_email_digest_outbox():
+    """Digest items are in the outbox while they wait: replayed after a crash, confirmed by the digest."""
+    data_dir = tempfile.mkdtemp(prefix="nekolink-check-")
+    cfg = ancs_bridge.BridgeConfig(
+        enable_telegram=False, enable_windows_toast=False, enable_email=True,
+        email_digest_enabled=True, email_digest_seconds=60, email_digest_max_items=50,
+    )
+
+    def manager_with(sent: List[dict]):
+        m = ancs_bridge.BridgeManager(cfg, lambda s: None, lambda p: None, data_dir=data_dir)
+        m._send_spec = lambda spec, timeout: sent.append(spec)
+        m._get_outbox()
+        return m
+
+    first: List[dict] = []
+    crashed = manager_with(first)
+    for i in range(3):
+        crashed._forward({"app": "com.example", "title": f"t{i}", "msg": f"m{i}", "ts": time.time()})
+    assert crashed.outbox_depth() == 3, crashed.outbox_depth()
+    crashed._outbox.flush()  # past the group-commit window
+
+    # a second process on the same data dir stands in for the restart after a crash
+    replayed: List[dict] = []
+    restarted = manager_with(replayed)
+    _wait(lambda: len(replayed) >= 3 and restarted.outbox_depth() == 0)
+    restarted.shutdown(timeout=1.0)
+    assert [s["tag"] for s in replayed] == ["MAIL"] * 3, replayed
+
+    digest: List[dict] = []
+    m = manager_with(digest)
+    for i in range(3):
+        m._forward({"app": "com.example", "title": f"t{i}", "msg": f"m{i}", "ts": time.time()})
+    m._batchers["email"].flush()
+    _wait(lambda: digest and m.outbox_depth() == 0)
+    m.shutdown(timeout=1.0)
+    assert [s["tag"] for s in digest] == ["MAIL-digest"], digest
+    assert m.outbox_depth() == 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-k", help="run only checks whose name contains this")
+    args = ap.parse_args(argv)
+
+    failed = 0
+    for name, fn in CHECKS.items():
+        if args.k and args.k not in name:
+            continue
+        try:
+            fn()
+            print(f"ok    {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL  {name}: {type(e).__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+# benchmarks/fake_ancs.py
+# -*- coding: utf-8 -*-
+"""
+Scriptable fake ANCS peripheral, standing in for bleak's BleakClient and
+BleakScanner so the real _ANCSSession / BridgeManager code runs without an
+iPhone or a Bluetooth stack.
+
+    phone = FakePhone("FA:KE:00:00:00:01", mtu=185)
+    with patch_bleak(ancs_bridge, [phone]):
+        manager.start_all([phone.address])
+        run_scenario(phone, [{"op": "burst", "count": 50}, {"op": "disconnect", "down_seconds": 2}])
+
+The phone answers Control Point writes (GetNotificationAttributes and
+GetAppAttributes) with Data Source responses split at the configured MTU,
+one response at a time as a real phone does, and can drop responses, go
+out of range, or push Battery Level notifications.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+ANCS_SERVICE = "7905f431-b5ce-4e99-a40f-4b1e122d00d0"
+NOTIF_SRC = "9fbf120d-6301-42d9-8c58-25e699a21dbd"
+CTRL_PT = "69d1d8f3-45e1-49a8-9821-9bbdfdaad9d9"
+DATA_SRC = "22eac6e9-24d6-4bb5-be44-b36ace7c7bfb"
+BATTERY_LEVEL_CHAR = "00002a19-0000-1000-8000-00805f9b34fb"
+
+# attribute IDs that carry a 2-byte max length in the request
+_SIZED_ATTRS = (1, 2, 3)
+
+
+class FakeBleakError(Exception):
+    pass
+
+
+@dataclass
+class FakeNotification:
+    app: str
+    title: str = ""
+    msg: str = ""
+    subtitle: str = ""
+    date: str = ""
+    category: int = 0
+    uid: int = 0
+    posted: float = 0.0  # time.monotonic() when the phone raised it
+
+
+def _truncate(text: str, max_len: int) -> bytes:
+    b = text.encode("utf-8")
+    if len(b) <= max_len:
+        return b
+    return b[:max_len].decode("utf-8", "ignore").encode("utf-8")
+
+
+def _attr(attr_id: int, value: bytes) -> bytes:
+    return bytes([attr_id]) + len(value).to_bytes(2, "little") + value
+
+
+@dataclass
+class _Characteristic:
+    uuid: str
+    properties: List[str]
+
+
+class _Services:
+    def __init__(self, phone: "FakePhone"):
+        cp_props = ["write"] + (["write-without-response"] if phone.write_without_response else [])
+        bat_props = ["read"] + (["notify"] if phone.battery_notify else [])
+        self._chars = {
+            NOTIF_SRC: _Characteristic(NOTIF_SRC, ["notify"]),
+            CTRL_PT: _Characteristic(CTRL_PT, cp_props),
+            DATA_SRC: _Characteristic(DATA_SRC, ["notify"]),
+            BATTERY_LEVEL_CHAR: _Characteristic(BATTERY_LEVEL_CHAR, bat_props),
+        }
+
+    def get_characteristic(self, uuid: str) -> Optional[_Characteristic]:
+        return self._chars.get(uuid)
+
+
+class FakePhone:
+    """
+    One emulated iPhone. Thread-safe entry points (post, disconnect,
+    set_battery) may be called from any thread; everything that talks to a
+    connected client runs on that client's event loop.
+    """
+
+    def __init__(
+        self,
+        address: str = "FA:KE:00:00:00:01",
+        name: str = "iPhone",
+        mtu: int = 185,
+        chunk_interval: float = 0.0075,  # one connection event per chunk
+        response_delay: float = 0.01,  # CP write -> first Data Source chunk
+        drop_rate: float = 0.0,  # chance a Data Source response is never sent
+        battery: int = 80,
+        battery_notify: bool = True,
+        write_without_response: bool = False,
+        app_names: Optional[Dict[str, str]] = None,
+        seed: int = 0,
+    ):
+        self.address = address
+        self.name = name
+        self.mtu = int(mtu)
+        self.chunk_interval = float(chunk_interval)
+        self.response_delay = float(response_delay)
+        self.drop_rate = float(drop_rate)
+        self.battery = int(battery)
+        self.battery_notify = battery_notify
+        self.write_without_response = write_without_response
+        self.app_names = dict(app_names or {})
+        self._rnd = random.Random(seed)
+
+        self.notifications: Dict[int, FakeNotification] = {}
+        # not fetched by the bridge yet; announced again when it (re)subscribes, the way a
+        # real phone re-announces what is still in Notification Center after a reconnect
+        self._undelivered: Dict[int, FakeNotification] = {}
+        self._next_uid = 1
+        self._lock = threading.Lock()
+        self._client: Optional["FakeBleakClient"] = None
+        self._down_until = 0.0
+        self.stats = {"posted": 0, "cp_writes": 0, "responses": 0, "dropped": 0, "connects": 0}
+
+    # ---------- scenario API ----------
+    def post(self, app: str, title: str = "", msg: str = "", date: str = "", category: int = 0) -> int:
+        with self._lock:
+            uid = self._next_uid
+            self._next_uid += 1
+            n = FakeNotification(app, title, msg, date=date or time.strftime("%Y%m%dT%H%M%S"),
+                                 category=category, uid=uid, posted=time.monotonic())
+            self.notifications[uid] = n
+            self._undelivered[uid] = n
+            self.stats["posted"] += 1
+            client = self._client
+        if client is not None:
+            client._call(client._push_event, n)
+        return uid
+
+    def disconnect(self, down_seconds: float = 0.0):
+        """Drop the link; reconnects fail until down_seconds have passed."""
+        with self._lock:
+            self._down_until = time.monotonic() + float(down_seconds)
+            client = self._client
+        if client is not None:
+            client._call(client._drop)
+
+    def set_battery(self, level: int):
+        self.battery = int(level)
+        client = self._client
+        if client is not None:
+            client._call(client._push_battery)
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    # ---------- protocol ----------
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _notification_response(self, data: bytes) -> bytes:
+        uid = int.from_bytes(data[1:5], "little")
+        n = self.notifications.get(uid)
+        if n is None:
+            raise FakeBleakError("ATT error 0xA2 (invalid parameter): unknown UID")
+        out = bytearray(data[:5])
+        i = 5
+        while i < len(data):
+            attr_id = data[i]
+            i += 1
+            max_len = 0xFFFF
+            if attr_id in _SIZED_ATTRS:
+                max_len = int.from_bytes(data[i: i + 2], "little")
+                i += 2
+            if attr_id == 0:
+                value = n.app.encode("utf-8")
+            elif attr_id == 1:
+                value = _truncate(n.title, max_len)
+            elif attr_id == 2:
+                value = _truncate(n.subtitle, max_len)
+            elif attr_id == 3:
+                value = _truncate(n.msg, max_len)
+            elif attr_id == 4:
+                value = str(len(n.msg)).encode("ascii")
+            elif attr_id == 5:
+                value = n.date.encode("ascii")
+            else:
+                value = b""
+            out += _attr(attr_id, value)
+        return bytes(out)
+
+    def _app_response(self, data: bytes) -> bytes:
+        end = data.index(b"\x00", 1)
+        app = data[1:end].decode("utf-8", "ignore")
+        out = bytearray(data[: end + 1])
+        for attr_id in data[end + 1:]:
+            value = self.app_names.get(app, "").encode("utf-8") if attr_id == 0 else b""
+            out += _attr(attr_id, value)
+        return bytes(out)
+
+    def answer(self, data: bytes) -> bytes:
+        """Data Source response for one Control Point command."""
+        if not data:
+            raise FakeBleakError("empty Control Point write")
+        if data[0] == 0:
+            return self._notification_response(data)
+        if data[0] == 1:
+            return self._app_response(data)
+        raise FakeBleakError("ATT error 0xA1 (unknown command)")
+
+
+class FakeBleakClient:
+    """Drop-in for bleak.BleakClient, bound to a FakePhone by address."""
+
+    phones: Dict[str, FakePhone] = {}
+
+    def __init__(self, address, disconnected_callback=None, timeout: float = 10.0, **_kwargs):
+        self.address = getattr(address, "address", address)
+        self._disconnected_callback = disconnected_callback
+        self._phone = self.phones.get(self.address)
+        self._connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subs: Dict[str, object] = {}
+        self._responses: Optional[asyncio.Queue] = None
+        self._responder: Optional[asyncio.Task] = None
+        self.services = _Services(self._phone) if self._phone else None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def __aenter__(self) -> "FakeBleakClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def connect(self, **_kwargs) -> bool:
+        phone = self._phone
+        if phone is None or not phone._available():
+            await asyncio.sleep(0.05)
+            raise FakeBleakError(f"Device with address {self.address} was not found")
+        self._loop = asyncio.get_running_loop()
+        self._responses = asyncio.Queue()
+        self._responder = self._loop.create_task(self._respond())
+        self._connected = True
+        with phone._lock:
+            phone._client = self
+            phone.stats["connects"] += 1
+        return True
+
+    async def disconnect(self) -> bool:
+        self._drop()
+        return True
+
+    def _call(self, fn, *args):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(fn, *args)
+
+    def _drop(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._subs.clear()
+        if self._responder is not None:
+            self._responder.cancel()
+        phone = self._phone
+        with phone._lock:
+            if phone._client is self:
+                phone._client = None
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    def _notify(self, uuid: str, data: bytes):
+        cb = self._subs.get(uuid)
+        if cb is not None and self._connected:
+            cb(0, bytearray(data))
+
+    def _push_event(self, n: FakeNotification):
+        if NOTIF_SRC not in self._subs or not self._connected:
+            return  # stays undelivered until the next subscription
+        # EventID added, flags, category, category count, UID
+        self._notify(NOTIF_SRC, bytes([0, 0, n.category, 1]) + n.uid.to_bytes(4, "little"))
+
+    def _push_battery(self):
+        if self._phone.battery_notify:
+            self._notify(BATTERY_LEVEL_CHAR, bytes([self._phone.battery]))
+
+    async def _respond(self):
+        # the phone answers commands strictly one after another
+        phone = self._phone
+        step = max(1, phone.mtu - 3)
+        while True:
+            uid, resp = await self._responses.get()
+            await asyncio.sleep(phone.response_delay)
+            if phone._rnd.random() < phone.drop_rate:
+                phone.stats["dropped"] += 1
+                continue
+            for i in range(0, len(resp), step):
+                if i:
+                    await asyncio.sleep(phone.chunk_interval)
+                self._notify(DATA_SRC, resp[i: i + step])
+            phone.stats["responses"] += 1
+            if uid is not None and self._connected:
+                with phone._lock:
+                    phone._undelivered.pop(uid, None)
+
+    # ---------- GATT ----------
+    def _check(self, uuid: str):
+        if not self._connected:
+            raise FakeBleakError("Not connected")
+        if self.services.get_characteristic(uuid) is None:
+            raise FakeBleakError(f"Characteristic {uuid} was not found")
+
+    async def start_notify(self, char, callback, **_kwargs):
+        uuid = getattr(char, "uuid", char)
+        self._check(uuid)
+        if "notify" not in self.services.get_characteristic(uuid).properties:
+            raise FakeBleakError(f"Characteristic {uuid} does not support notify")
+        self._subs[uuid] = callback
+        if uuid == NOTIF_SRC:
+            # what was posted while disconnected is announced on subscribe
+            with self._phone._lock:
+                missed = list(self._phone._undelivered.values())
+            for n in missed:
+                self._push_event(n)
+
+    async def stop_notify(self, char):
+        self._subs.pop(getattr(char, "uuid", char), None)
+
+    async def read_gatt_char(self, char, **_kwargs) -> bytearray:
+        uuid = getattr(char, "uuid", char)
+        self._check(uuid)
+        if uuid == BATTERY_LEVEL_CHAR:
+            return bytearray([self._phone.battery])
+        raise FakeBleakError("ATT error 0x02 (read not permitted)")
+
+    async def write_gatt_char(self, char, data, response: bool = False):
+        uuid = getattr(char, "uuid", char)
+        self._check(uuid)
+        if uuid != CTRL_PT:
+            raise FakeBleakError("ATT error 0x03 (write not permitted)")
+        self._phone.stats["cp_writes"] += 1
+        data = bytes(data)
+        resp = self._phone.answer(data)
+        if response:
+            await asyncio.sleep(self._phone.chunk_interval)
+        uid = int.from_bytes(data[1:5], "little") if data[0] == 0 else None
+        self._responses.put_nowait((uid, resp))
+
+
+@dataclass
+class _Device:
+    address: str
+    name: str
+    rssi: int = -50
+    details: dict = field(default_factory=dict)
+
+
+class FakeBleakScanner:
+    @staticmethod
+    async def discover(timeout: float = 5.0, **_kwargs) -> List[_Device]:
+        await asyncio.sleep(min(0.05, timeout))
+        return [_Device(p.address, p.name) for p in FakeBleakClient.phones.values() if p._available()]
+
+
+@contextlib.contextmanager
+def patch_bleak(module, phones: List[FakePhone]) -> Iterator[None]:
+    """Point module.BleakClient / module.BleakScanner at the fakes for the given phones."""
+    saved = (module.BleakClient, module.BleakScanner, dict(FakeBleakClient.phones))
+    FakeBleakClient.phones = {p.address: p for p in phones}
+    module.BleakClient, module.BleakScanner = FakeBleakClient, FakeBleakScanner
+    try:
+        yield
+    finally:
+        module.BleakClient, module.BleakScanner, FakeBleakClient.phones = saved
+
+
+def run_scenario(phone: FakePhone, steps: List[dict], rnd: Optional[random.Random] = None) -> List[int]:
+    """
+    Play scripted steps against a phone (blocking, from the caller's thread):
+
+        {"op": "notify", "app": ..., "title": ..., "msg": ...}
+        {"op": "burst", "count": 50, "interval": 0.0, "app": ..., "msg_len": 120}
+        {"op": "sleep", "seconds": 1.0}
+        {"op": "disconnect", "down_seconds": 2.0}
+        {"op": "wait_connected", "timeout": 10.0}
+        {"op": "battery", "level": 42}
+
+    Returns the UIDs posted.
+    """
+    rnd = rnd or random.Random(1)
+    uids: List[int] = []
+    for step in steps:
+        op = step.get("op")
+        if op == "notify":
+            uids.append(phone.post(step.get("app", "com.example"), step.get("title", ""), step.get("msg", "")))
+        elif op == "burst":
+            for i in range(int(step.get("count", 10))):
+                body = "消息 message 🐾 " * max(1, int(step.get("msg_len", 120)) // 15)
+                code = f" 验证码 {rnd.randint(100000, 999999)}" if rnd.random() < float(step.get("code_rate", 0.1)) else ""
+                uids.append(phone.post(step.get("app", "com.tencent.xin"), f"{step.get('title', 'chat')} {i}",
+                                       f"{i}: {body}{code}"))
+                if step.get("interval"):
+                    time.sleep(float(step["interval"]))
+        elif op == "sleep":
+            time.sleep(float(step.get("seconds", 1.0)))
+        elif op == "disconnect":
+            phone.disconnect(float(step.get("down_seconds", 0.0)))
+        elif op == "wait_connected":
+            deadline = time.monotonic() + float(step.get("timeout", 10.0))
+            while not phone.connected and time.monotonic() < deadline:
+                time.sleep(0.02)
+            time.sleep(float(step.get("settle", 0.1)))  # let the session subscribe
+        elif op == "battery":
+            phone.set_battery(int(step.get("level", 50)))
+        else:
+            raise ValueError(f"unknown scenario op: {op!r}")
+    return uids
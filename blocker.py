@@ -0,0 +1,122 @@
+# blocker.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+# Keyword scopes. A keyword written as "app:com.taobao", "title:促销" or
+# "msg:优惠" only matches that field; anything else matches every field.
+SCOPES = ("app", "title", "msg")
+
+
+class _Automaton:
+    """Aho-Corasick automaton: all keywords found in one pass over the text."""
+
+    __slots__ = ("goto", "fail", "out")
+
+    def __init__(self, keywords: Iterable[str]):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[bool] = [False]
+        for kw in keywords:
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(False)
+                state = nxt
+            out[state] = True
+
+        # BFS for failure links; a state is terminal if any suffix of it is a keyword
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        i = 0
+        while i < len(queue):
+            s = queue[i]
+            i += 1
+            for ch, t in goto[s].items():
+                queue.append(t)
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                ft = goto[f].get(ch, 0)
+                fail[t] = ft if ft != t else 0
+                out[t] = out[t] or out[fail[t]]
+
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def search(self, text: str) -> bool:
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for ch in text:
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            if nxt is None:
+                state = 0
+                continue
+            state = nxt
+            if out[state]:
+                return True
+        return False
+
+
+def parse_keyword(raw: str) -> Tuple[str, str]:
+    """'title:促销' -> ('title', '促销'); unscoped keywords get scope ''."""
+    k = (raw or "").strip()
+    head, sep, rest = k.partition(":")
+    if sep and head.strip().lower() in SCOPES and rest.strip():
+        return head.strip().lower(), rest.strip()
+    return "", k
+
+
+class KeywordBlocker:
+    """
+    Block keywords compiled once (on config load/save) and matched in a single
+    pass per field. With case_insensitive, keywords and text are casefolded,
+    which also covers non-ASCII case pairs.
+    """
+
+    def __init__(self, keywords: Iterable[str], case_insensitive: bool = True):
+        self.case_insensitive = bool(case_insensitive)
+        unscoped: List[str] = []
+        scoped: Dict[str, List[str]] = {f: [] for f in SCOPES}
+        for raw in keywords or []:
+            scope, kw = parse_keyword(raw)
+            if not kw:
+                continue
+            if self.case_insensitive:
+                kw = kw.casefold()
+            (scoped[scope] if scope else unscoped).append(kw)
+        self.count = len(unscoped) + sum(len(v) for v in scoped.values())
+
+        # one automaton per field: that field's scoped keywords + the unscoped ones
+        self._any = _Automaton(unscoped) if unscoped else None
+        self._by_field: Dict[str, _Automaton] = {}
+        for f in SCOPES:
+            if scoped[f]:
+                self._by_field[f] = _Automaton(scoped[f] + unscoped)
+            elif self._any is not None:
+                self._by_field[f] = self._any
+        if self._any is not None:
+            self._by_field["date"] = self._any
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def is_blocked(self, app: str = "", title: str = "", msg: str = "", date: str = "") -> bool:
+        if not self._by_field:
+            return False
+        ci = self.case_insensitive
+        for f, text in (("app", app), ("title", title), ("msg", msg), ("date", date)):
+            ac = self._by_field.get(f)
+            if ac is None or not text:
+                continue
+            if ac.search(text.casefold() if ci else text):
+                return True
+        return False
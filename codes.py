@@ -0,0 +1,84 @@
+# codes.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+# Named patterns that can be referenced from code_app_rules without defining
+# them in code_patterns. "default" is always BridgeConfig.code_regex.
+BUILTIN_PATTERNS: Dict[str, str] = {
+    # exactly six digits, not part of a longer number (most bank / SMS OTPs)
+    "digits6": r"(?<!\d)\d{6}(?!\d)",
+    # digits right after a code keyword, e.g. "验证码：123456", "code is 4821"
+    "keyword": r"(?i)(?:验证码|校验码|动态码|確認コード|認証コード|コード|code|otp|pin)\D{0,12}?(\d{4,8})(?!\d)",
+}
+
+_HAS_DIGIT = re.compile(r"\d").search
+
+
+class CodeExtractor:
+    """
+    Verification-code extraction compiled once per config.
+
+    Rules map an app bundle ID (exact, or a prefix ending in "*") to a list of
+    pattern names; apps without a rule use "default". Only the title and
+    message are searched, so dates and bundle IDs never produce codes, and
+    text without any digit skips the regex work entirely.
+    """
+
+    def __init__(
+        self,
+        default_regex: str,
+        patterns: Optional[Dict[str, str]] = None,
+        app_rules: Optional[Dict[str, str]] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ):
+        sources = dict(BUILTIN_PATTERNS)
+        sources.update(patterns or {})
+        sources["default"] = default_regex or r"\b\d{4,8}\b"
+
+        self.compiled: Dict[str, Pattern[str]] = {}
+        for name, src in sources.items():
+            try:
+                self.compiled[name] = re.compile(src)
+            except re.error as e:
+                if log:
+                    log(f"[CODE] bad pattern {name!r}: {e}")
+
+        self._default = [self.compiled["default"]] if "default" in self.compiled else []
+        self._exact: Dict[str, List[Pattern[str]]] = {}
+        self._prefix: List[Tuple[str, List[Pattern[str]]]] = []
+        for app, names in (app_rules or {}).items():
+            pats = [self.compiled[n.strip()] for n in str(names).split(",") if n.strip() in self.compiled]
+            app = app.strip()
+            if app.endswith("*"):
+                self._prefix.append((app[:-1], pats))
+            elif app:
+                self._exact[app] = pats
+        self._prefix.sort(key=lambda x: len(x[0]), reverse=True)
+        self._resolved: Dict[str, List[Pattern[str]]] = {}
+
+    def patterns_for(self, app: str) -> List[Pattern[str]]:
+        pats = self._resolved.get(app)
+        if pats is None:
+            pats = self._exact.get(app)
+            if pats is None:
+                pats = next((p for prefix, p in self._prefix if app.startswith(prefix)), self._default)
+            self._resolved[app] = pats
+        return pats
+
+    def extract(self, app: str, title: str, msg: str) -> List[str]:
+        if not (title and _HAS_DIGIT(title)) and not (msg and _HAS_DIGIT(msg)):
+            return []
+        out: List[str] = []
+        for pat in self.patterns_for(app or ""):
+            for text in (title, msg):
+                if not text:
+                    continue
+                for m in pat.findall(text):
+                    if isinstance(m, tuple):
+                        m = next((g for g in m if g), "")
+                    if m and m not in out:
+                        out.append(m)
+        return out
@@ -0,0 +1,221 @@
+# control_point.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from ancs_parser import DataSourceParser, DataSourceResponse
+
+Key = Tuple[int, object]  # (command id, UID or app id)
+
+
+@dataclass
+class _Request:
+    key: Key
+    payload: bytes
+    attr_count: int
+    attempts: int = 0
+    sent: float = 0.0
+    progress: float = 0.0  # last time Data Source bytes of this response arrived
+
+
+class ControlPointQueue:
+    """
+    Per-session scheduler for Control Point commands.
+
+    Commands are written one at a time, in order; up to max_inflight of them
+    may be waiting for their Data Source response at once. Each response is
+    matched back to its request by (command, UID / app id), so a burst of
+    notifications is drained without responses overwriting each other.
+
+    The timeout counts from the write, or from the last Data Source chunk
+    (on_data) if that is later: the phone answers one request at a time, so
+    neither a long response on a slow link nor the requests waiting behind it
+    are cut off. A request that got no answer at all is sent once
+    more, then dropped; one whose answer started and then stalled is dropped
+    without a re-send. Answers still owed for a re-sent or dropped request
+    stay expected by the parser for another timeout ("ghosts"), and no new
+    request for that key goes out meanwhile, so a late answer is parsed and
+    discarded instead of being framed with the wrong attribute count.
+    run() is the worker and lives as long as the connection.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[bytes], Awaitable[None]],
+        parser: DataSourceParser,
+        max_inflight: int = 2,
+        timeout: float = 5.0,
+        retries: int = 1,
+        log: Optional[Callable[[str], None]] = None,
+        on_rtt: Optional[Callable[[float], None]] = None,
+    ):
+        self.write = write
+        self.parser = parser
+        self.max_inflight = max(1, int(max_inflight))
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+        self.log = log
+        self.on_rtt = on_rtt  # seconds from write to complete response
+        self._pending: Deque[_Request] = deque()
+        self._queued: Dict[Key, _Request] = {}
+        self._inflight: Dict[Key, _Request] = {}
+        self._ghosts: Dict[Key, Tuple[int, float]] = {}  # key -> (answers still owed, expiry)
+        self._last_data = 0.0
+        self._wake = asyncio.Event()
+        self.stats = {"sent": 0, "answered": 0, "timeouts": 0, "dropped": 0, "late": 0, "max_pending": 0}
+
+    def submit(self, command_id: int, key, payload: bytes, attr_count: int) -> bool:
+        """Queue one command; False if the same request is already queued or in flight."""
+        k = (command_id, key)
+        if k in self._queued or k in self._inflight:
+            return False
+        req = _Request(k, bytes(payload), int(attr_count))
+        self._queued[k] = req
+        self._pending.append(req)
+        if len(self._pending) > self.stats["max_pending"]:
+            self.stats["max_pending"] = len(self._pending)
+        self._wake.set()
+        return True
+
+    def on_response(self, resp: DataSourceResponse):
+        k = (resp.command_id, resp.uid if resp.command_id == 0 else resp.app_id)
+        req = self._inflight.pop(k, None)
+        if req is None:
+            req = self._queued.pop(k, None)  # answered late while waiting for its re-send
+            if req is not None:
+                self._pending.remove(req)
+        if req is None:
+            ghost = self._ghosts.pop(k, None)
+            if ghost is not None:
+                self.stats["late"] += 1
+                if ghost[0] > 1:
+                    self._ghosts[k] = (ghost[0] - 1, ghost[1])
+                self._wake.set()
+            return
+        self.stats["answered"] += 1
+        if self.on_rtt is not None:
+            self.on_rtt(time.monotonic() - req.sent)
+        self._leave(req)
+        self._wake.set()
+
+    def on_data(self):
+        """Call after each Data Source chunk: an answer in progress keeps requests alive."""
+        self._last_data = time.monotonic()
+        k = self.parser.receiving
+        if k is not None:
+            req = self._inflight.get(k)
+            if req is not None:
+                req.progress = self._last_data
+
+    def _leave(self, req: _Request):
+        """req is finished with; answers the parser still expects for it become a ghost."""
+        # every expectation for one key has the same count (a ghost blocks new requests
+        # for the key), so which of them is forgotten later does not matter
+        owed = self.parser.expecting(*req.key)
+        if owed > 0:
+            self._ghosts[req.key] = (owed, time.monotonic() + self.timeout)
+
+    def reset(self):
+        """Forget everything, e.g. after a disconnect (UIDs are re-announced on reconnect)."""
+        for k in list(self._inflight) + list(self._ghosts):
+            self.parser.forget(*k)
+        self._pending.clear()
+        self._queued.clear()
+        self._inflight.clear()
+        self._ghosts.clear()
+        self._last_data = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def _expire(self) -> Optional[float]:
+        """Handle timed-out requests and ghosts; returns seconds until the next deadline."""
+        now = time.monotonic()
+        next_in: Optional[float] = None
+        busy_until = self._last_data + self.timeout
+        for k, (owed, until) in list(self._ghosts.items()):
+            until = max(until, busy_until)
+            if until > now:
+                next_in = until - now if next_in is None else min(next_in, until - now)
+                continue
+            del self._ghosts[k]
+            self.parser.forget(*k, n=owed)
+        for k, req in list(self._inflight.items()):
+            left = max(req.sent, self._last_data) + self.timeout - now
+            if left > 0:
+                next_in = left if next_in is None else min(next_in, left)
+                continue
+            self._inflight.pop(k, None)
+            self.stats["timeouts"] += 1
+            if req.progress:
+                # the answer started and stalled: a re-send would only race the rest of it
+                if self.parser.receiving == k:
+                    self.parser.abandon()
+                self._drop(req, "response stalled")
+            else:
+                self._retry_or_drop(req, "no response")
+        return next_in
+
+    def _retry_or_drop(self, req: _Request, why: str):
+        if req.attempts <= self.retries:
+            self._queued[req.key] = req
+            self._pending.appendleft(req)
+        else:
+            self._drop(req, why)
+
+    def _drop(self, req: _Request, why: str):
+        self.stats["dropped"] += 1
+        if self.log:
+            self.log(f"[CP] dropped {req.key}: {why}")
+        self._leave(req)
+
+    def _next_sendable(self) -> Optional[_Request]:
+        """First queued request whose key has no answers outstanding from an earlier send."""
+        for req in self._pending:
+            if req.key not in self._ghosts:
+                self._pending.remove(req)
+                return req
+        return None
+
+    async def _send(self, req: _Request):
+        self._queued.pop(req.key, None)
+        req.attempts += 1
+        req.sent = time.monotonic()
+        req.progress = 0.0
+        self._inflight[req.key] = req
+        self.parser.expect(req.key[0], req.key[1], req.attr_count)
+        try:
+            await self.write(req.payload)
+            self.stats["sent"] += 1
+        except Exception as e:
+            self._inflight.pop(req.key, None)
+            self.parser.forget(*req.key, n=1)
+            self._retry_or_drop(req, str(e))
+            raise
+
+    async def run(self):
+        while True:
+            next_in = self._expire()
+            try:
+                while len(self._inflight) < self.max_inflight:
+                    req = self._next_sendable()
+                    if req is None:
+                        break
+                    await self._send(req)
+                    next_in = self.timeout if next_in is None else min(next_in, self.timeout)
+            except Exception as e:
+                if self.log:
+                    self.log(f"[CP] write error: {e}")
+                await asyncio.sleep(0.2)
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=next_in)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,60 @@
+# dedup.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+def fingerprint(parts: Iterable[object]) -> bytes:
+    """Fixed-size (16 byte) content key; the message text itself is not kept."""
+    raw = "\x1f".join(["" if p is None else str(p) for p in parts])
+    return hashlib.blake2b(raw.encode("utf-8", "replace"), digest_size=16).digest()
+
+
+class DedupIndex:
+    """
+    "Seen within the last window seconds?" with bounded memory.
+
+    Entries are kept in insertion order (refreshing an entry moves it to the
+    end), so expired ones are always at the front and eviction is O(1) per
+    entry. max_entries caps the size even if notifications arrive faster than
+    they expire.
+    """
+
+    def __init__(self, window: float = 8.0, max_entries: int = 4096):
+        self.window = float(window)
+        self.max_entries = max(1, int(max_entries))
+        self._seen: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check_and_add(self, key: bytes, now: float) -> bool:
+        """True if key is new (and records it), False if seen within the window."""
+        with self._lock:
+            self._expire(now)
+            last: Optional[float] = self._seen.get(key)
+            if last is not None and (now - last) < self.window:
+                return False
+            self._seen[key] = now
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return True
+
+    def _expire(self, now: float):
+        seen = self._seen
+        cutoff = now - self.window
+        while seen:
+            k = next(iter(seen))
+            if seen[k] > cutoff:
+                break
+            del seen[k]
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
@@ -0,0 +1,474 @@
+# delivery.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# A step is one outbound call for a destination, e.g. the message itself and then
+# the separate code message. It receives the time budget (seconds) it may use.
+Step = Tuple[str, Callable[[float], None]]
+
+
+class RateLimited(RuntimeError):
+    """Raised by a sender when the server asks us to slow down (429, Retry-After, ...)."""
+
+    def __init__(self, retry_after: float, detail: str = ""):
+        super().__init__(detail or f"rate limited, retry after {retry_after:.0f}s")
+        self.retry_after = max(0.0, float(retry_after))
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """
+    True for failures worth retrying later (network down, timeouts, 5xx, SMTP 4xx);
+    False for ones that will fail the same way again (bad token, missing settings).
+    """
+    if isinstance(e, RateLimited):
+        return True
+    if not isinstance(e, OSError):
+        return False
+    # smtplib.SMTPException and requests.RequestException are both OSError subclasses
+    code = getattr(e, "smtp_code", None)
+    if isinstance(code, int):
+        return 400 <= code < 500
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in (408, 429)
+    if type(e).__module__ == "smtplib":
+        # the server hung up (idle timeout, restart); auth / recipient errors stay permanent
+        return type(e).__name__ == "SMTPServerDisconnected"
+    return True
+
+
+class TokenBucket:
+    """
+    Paces sends ahead of time (per_minute tokens, up to burst in a row) and
+    holds everything back while a server-imposed backoff is active.
+    per_minute <= 0 means no pacing, only server hints.
+    """
+
+    def __init__(self, per_minute: float = 0, burst: int = 1):
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self.configure(per_minute, burst)
+
+    def configure(self, per_minute: float, burst: int):
+        with self._lock:
+            self.rate = max(0.0, float(per_minute or 0)) / 60.0
+            self.burst = max(1, int(burst or 1))
+            self._tokens = float(self.burst)
+            self._stamp = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token; returns how long the caller must wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if self.rate <= 0:
+                return wait
+            self._tokens = min(float(self.burst), self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1.0
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def penalize(self, seconds: float):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+            self._tokens = min(self._tokens, 0.0)
+
+    def blocked_for(self) -> float:
+        with self._lock:
+            return max(0.0, self._blocked_until - time.monotonic())
+
+
+@dataclass
+class RetryPolicy:
+    retry_max: int = 3
+    base_seconds: float = 1.0
+    max_delay_seconds: float = 30.0
+    breaker_threshold: int = 5
+    breaker_cooldown_seconds: float = 30.0
+    breaker_max_cooldown_seconds: float = 600.0
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter: half fixed, half random."""
+        d = min(self.max_delay_seconds, self.base_seconds * (2 ** max(0, attempt - 1)))
+        return d / 2 + random.uniform(0, d / 2)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after breaker_threshold transient failures in a row.
+    While open, sends are refused without touching the network; after the
+    cooldown one probe is let through (half-open). A probe that fails
+    transiently re-opens the breaker with a doubled cooldown; any answer from
+    the server (success, 429, permanent error) closes it. A probe that never
+    went out (deadline) is handed back with cancel_probe().
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, policy: RetryPolicy, log: Callable[[str], None]):
+        self.name = name
+        self.policy = policy
+        self.log = log
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._cooldown = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+                self.state = self.HALF_OPEN
+                self.log(f"[BREAKER] {self.name} half-open, probing")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                self.log(f"[BREAKER] {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._cooldown = 0.0
+
+    def cancel_probe(self):
+        """The half-open probe was not sent; let the next job probe instead."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._cooldown = min(self.policy.breaker_max_cooldown_seconds, self._cooldown * 2)
+            elif self.state == self.CLOSED and self.failures >= max(1, self.policy.breaker_threshold):
+                self._cooldown = float(self.policy.breaker_cooldown_seconds)
+            else:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.log(f"[BREAKER] {self.name} open for {self._cooldown:.0f}s after {self.failures} failures")
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._cooldown - (time.monotonic() - self._opened_at))
+
+
+@dataclass
+class DeliveryJob:
+    dest: str
+    steps: List[Step]
+    deadline: float
+    created: float = field(default_factory=time.time)
+    # called with the steps that were never attempted (deadline passed / queue overflow)
+    on_skip: Optional[Callable[[List[Step]], None]] = None
+    # False for outbox replays: they only fill free room and must keep their order
+    evictable: bool = True
+
+    def skip(self, steps: List[Step]):
+        if self.on_skip is not None and steps:
+            try:
+                self.on_skip(steps)
+            except Exception:
+                pass
+
+
+class _DestWorker:
+    """
+    One thread + one bounded FIFO per destination.
+    A slow destination only ever delays its own queue.
+    """
+
+    def __init__(self, name: str, maxsize: int, log: Callable[[str], None], policy: RetryPolicy):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.log = log
+        self.policy = policy
+
+        self._q: Deque[DeliveryJob] = deque()
+        self._cv = threading.Condition()
+        self._closing = False
+        self._busy = False
+
+        self.limiter = TokenBucket()
+        self.throttled_seconds = 0.0
+        self.breaker = CircuitBreaker(name, policy, log)
+        self.retries = 0
+
+        self.thread = threading.Thread(target=self._run, name=f"nekolink-{name}", daemon=True)
+        self.thread.start()
+
+    def put(self, job: DeliveryJob):
+        with self._cv:
+            old = None
+            if len(self._q) >= self.maxsize:
+                # never block the BLE side: drop the oldest pending live job instead
+                old = next((j for j in self._q if j.evictable), None)
+                if old is not None:
+                    self._q.remove(old)
+                    self.log(f"[QUEUE] {self.name} full, dropped job from {time.strftime('%H:%M:%S', time.localtime(old.created))}")
+            self._q.append(job)
+            self._cv.notify_all()
+        if old is not None:
+            old.skip(old.steps)
+
+    def depth(self) -> int:
+        with self._cv:
+            return len(self._q) + (1 if self._busy else 0)
+
+    def wait_room(self, timeout: float) -> int:
+        """Wait (up to timeout) until the queue has free slots; returns how many."""
+        end = time.time() + timeout
+        with self._cv:
+            while len(self._q) >= self.maxsize and not self._closing:
+                left = end - time.time()
+                if left <= 0:
+                    break
+                self._cv.wait(left)
+            return 0 if self._closing else max(0, self.maxsize - len(self._q))
+
+    def close(self):
+        with self._cv:
+            self._closing = True
+            self._cv.notify_all()
+
+    def _next(self) -> Optional[DeliveryJob]:
+        with self._cv:
+            while not self._q and not self._closing:
+                self._cv.wait()
+            if not self._q:
+                return None
+            self._busy = True
+            return self._q.popleft()
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            try:
+                self._deliver(job)
+            finally:
+                with self._cv:
+                    self._busy = False
+                    self._cv.notify_all()
+
+    def _deliver(self, job: DeliveryJob):
+        for i, (tag, send) in enumerate(job.steps):
+            attempt = 0
+            while True:
+                if not self.breaker.allow():
+                    self.log(f"[{tag}] skipped: {self.name} circuit open")
+                    job.skip(job.steps[i:])
+                    return
+                wait = self.limiter.reserve()
+                if time.time() + wait >= job.deadline:
+                    self.log(f"[{tag}] dropped: deadline exceeded")
+                    self.breaker.cancel_probe()
+                    job.skip(job.steps[i:])
+                    return
+                if wait > 0:
+                    time.sleep(wait)
+                    self.throttled_seconds += wait
+                remaining = job.deadline - time.time()
+                try:
+                    send(min(10.0, remaining))
+                except RateLimited as e:
+                    # the server answered: it is up, only asking us to slow down
+                    self.breaker.record_success()
+                    self.limiter.penalize(e.retry_after)
+                    self.log(f"[{tag}] rate limited, retry in {e.retry_after:.0f}s")
+                    continue
+                except Exception as e:
+                    if not is_transient_error(e):
+                        self.breaker.record_success()  # reachable; retrying would not help
+                        self.log(f"[{tag}] failed: {e}")
+                        break
+                    self.breaker.record_failure()
+                    attempt += 1
+                    delay = self.policy.backoff(attempt)
+                    if (
+                        attempt > self.policy.retry_max
+                        or self.breaker.state == CircuitBreaker.OPEN
+                        or time.time() + delay >= job.deadline
+                    ):
+                        self.log(f"[{tag}] failed: {e} (giving up after {attempt} attempts)")
+                        job.skip(job.steps[i:])
+                        return
+                    self.retries += 1
+                    self.log(f"[{tag}] failed: {e}; retry {attempt}/{self.policy.retry_max} in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                break
+
+    def wait_idle(self, timeout: float) -> bool:
+        end = time.time() + timeout
+        with self._cv:
+            while self._q or self._busy:
+                left = end - time.time()
+                if left <= 0:
+                    return False
+                self._cv.wait(left)
+        return True
+
+
+class DeliveryPipeline:
+    """
+    Delivery stage between the BLE sessions and the destinations.
+
+    submit() never blocks: jobs land in a bounded per-destination FIFO and are
+    sent by that destination's worker, so destinations run in parallel and
+    each keeps its own order.
+    """
+
+    def __init__(self, log: Callable[[str], None], maxsize: int = 200, policy: Optional[RetryPolicy] = None):
+        self.log = log
+        self.maxsize = maxsize
+        self.policy = policy or RetryPolicy()  # shared by all workers; edit in place to reconfigure
+        self._workers: Dict[str, _DestWorker] = {}
+        self._lock = threading.Lock()
+
+    def _worker(self, dest: str) -> _DestWorker:
+        with self._lock:
+            w = self._workers.get(dest)
+            if w is None:
+                w = _DestWorker(dest, self.maxsize, self.log, self.policy)
+                self._workers[dest] = w
+            return w
+
+    def set_rate(self, dest: str, per_minute: float, burst: int):
+        self._worker(dest).limiter.configure(per_minute, burst)
+
+    def submit(
+        self,
+        dest: str,
+        steps: List[Step],
+        deadline_seconds: float,
+        on_skip: Optional[Callable[[List[Step]], None]] = None,
+        evictable: bool = True,
+    ):
+        if not steps:
+            return
+        job = DeliveryJob(
+            dest=dest,
+            steps=steps,
+            deadline=time.time() + max(1.0, float(deadline_seconds)),
+            on_skip=on_skip,
+            evictable=evictable,
+        )
+        self._worker(dest).put(job)
+
+    def wait_room(self, dest: str, timeout: float) -> int:
+        """Free slots in dest's queue, waiting up to timeout for at least one."""
+        return self._worker(dest).wait_room(timeout)
+
+    def depths(self) -> Dict[str, int]:
+        with self._lock:
+            workers = list(self._workers.values())
+        return {w.name: w.depth() for w in workers}
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """dest -> queue depth, throttling, retries and circuit breaker state"""
+        with self._lock:
+            workers = list(self._workers.values())
+        return {
+            w.name: {
+                "depth": w.depth(),
+                "throttled_s": round(w.throttled_seconds, 3),
+                "blocked_for_s": round(w.limiter.blocked_for(), 3),
+                "retries": w.retries,
+                "breaker": w.breaker.state,
+                "breaker_failures": w.breaker.failures,
+                "breaker_retry_in_s": round(w.breaker.retry_in(), 3),
+            }
+            for w in workers
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Let pending jobs drain (bounded by timeout), then stop the workers."""
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        end = time.time() + timeout
+        for w in workers:
+            w.wait_idle(max(0.0, end - time.time()))
+            w.close()
+
+
+class Batcher:
+    """
+    Collects items and hands them to on_flush as one list once the window
+    (seconds since the first item) expires or max_items is reached.
+    on_flush runs on the timer thread or the caller's thread; keep it cheap
+    (typically it just submits a job to the DeliveryPipeline).
+    """
+
+    def __init__(
+        self,
+        on_flush: Callable[[List[dict]], None],
+        window: float,
+        max_items: int,
+        log: Callable[[str], None],
+    ):
+        self.on_flush = on_flush
+        self.window = float(window)
+        self.max_items = max(1, int(max_items))
+        self.log = log
+
+        self._items: List[dict] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def add(self, item: dict):
+        with self._lock:
+            self._items.append(item)
+            if len(self._items) < self.max_items:
+                if self._timer is None:
+                    self._timer = threading.Timer(max(0.0, self.window), self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            items = self._take()
+        self._emit(items)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def _take(self) -> List[dict]:
+        items, self._items = self._items, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return items
+
+    def flush(self):
+        with self._lock:
+            items = self._take()
+        self._emit(items)
+
+    def _emit(self, items: List[dict]):
+        if not items:
+            return
+        try:
+            self.on_flush(items)
+        except Exception as e:
+            self.log(f"[BATCH] flush error: {e}")
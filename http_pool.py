@@ -0,0 +1,103 @@
+# http_pool.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import threading
+import time
+import urllib.parse
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import requests
+
+
+class HttpPool:
+    """
+    Long-lived keep-alive sessions, one per destination host (scheme://host:port).
+
+    The forwarder and the GUI test buttons share the module-level POOL, so a
+    TLS handshake to api.telegram.org / the Gotify server is paid once and then
+    reused. Sessions idle for longer than idle_seconds are closed on next access,
+    since most servers drop idle keep-alive connections anyway.
+    """
+
+    def __init__(self, pool_size: int = 4, idle_seconds: float = 90.0):
+        self.pool_size = max(1, int(pool_size))
+        self.idle_seconds = float(idle_seconds)
+        self._sessions: Dict[str, Tuple[requests.Session, float]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size: int, idle_seconds: float):
+        pool_size = max(1, int(pool_size or 1))
+        with self._lock:
+            changed = pool_size != self.pool_size
+            self.pool_size = pool_size
+            self.idle_seconds = float(idle_seconds or 0)
+            old = list(self._sessions.values()) if changed else []
+            if changed:
+                self._sessions.clear()
+        for s, _ in old:
+            _close_quietly(s)
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        u = urllib.parse.urlsplit(url)
+        return f"{u.scheme}://{u.netloc}".lower()
+
+    def _new_session(self) -> requests.Session:
+        # imported here so requests loads with the first HTTP delivery, not at startup
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        return s
+
+    def session_for(self, url: str) -> requests.Session:
+        key = self._host_key(url)
+        now = time.time()
+        stale = []
+        with self._lock:
+            if self.idle_seconds > 0:
+                for k, (s, last) in list(self._sessions.items()):
+                    if now - last > self.idle_seconds:
+                        stale.append(s)
+                        del self._sessions[k]
+            entry = self._sessions.get(key)
+            if entry is None:
+                sess = self._new_session()
+            else:
+                sess = entry[0]
+            self._sessions[key] = (sess, now)
+        for s in stale:
+            _close_quietly(s)
+        return sess
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.session_for(url).post(url, **kwargs)
+
+    def hosts(self) -> Dict[str, float]:
+        """host -> seconds since last use"""
+        now = time.time()
+        with self._lock:
+            return {k: now - last for k, (_, last) in self._sessions.items()}
+
+    def close(self):
+        with self._lock:
+            sessions = [s for s, _ in self._sessions.values()]
+            self._sessions.clear()
+        for s in sessions:
+            _close_quietly(s)
+
+
+def _close_quietly(s: Optional[requests.Session]):
+    try:
+        if s is not None:
+            s.close()
+    except Exception:
+        pass
+
+
+POOL = HttpPool()
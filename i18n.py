@@ -43,6 +43,7 @@ DICT: Dict[str, Dict[str, str]] = {
     "remove_selected": {"zh": "删除所选", "en": "Remove selected", "ja": "選択削除"},
     "clear": {"zh": "清空", "en": "Clear", "ja": "クリア"},
     "copy_selected": {"zh": "复制所选", "en": "Copy selected", "ja": "選択コピー"},
+    "delivery_status": {"zh": "发送状态", "en": "Delivery status", "ja": "送信状況"},
 
     "tip_tray": {
         "zh": "提示：点击关闭按钮会最小化到托盘。退出请在托盘菜单中操作。",
@@ -58,6 +59,11 @@ DICT: Dict[str, Dict[str, str]] = {
     "latest_preview": {"zh": "最新通知预览", "en": "Latest notification preview", "ja": "最新通知プレビュー"},
 
     "selected_ble": {"zh": "已选择的 BLE 地址", "en": "Selected BLE addresses", "ja": "選択されたBLEアドレス"},
+    "dedup_cross_adapter": {
+        "zh": "同一部 iPhone 通过多个地址连接（跨连接去重）",
+        "en": "Same iPhone via several addresses (dedup across links)",
+        "ja": "同じiPhoneに複数アドレスで接続（接続間で重複排除）",
+    },
     "scan_hint": {
         "zh": "扫描结果会显示在这里。双击一行可填入地址输入框。",
         "en": "Scan results will appear here. Double-click a line to fill the address input.",
@@ -65,9 +71,9 @@ DICT: Dict[str, Dict[str, str]] = {
     },
 
     "block_intro": {
-        "zh": "屏蔽关键词：通知文本包含任意关键词就会被忽略。",
-        "en": "Block keywords: if notification contains any of these, it will be ignored.",
-        "ja": "ブロック語句：通知に含まれる場合は無視されます。",
+        "zh": "屏蔽关键词：通知文本包含任意关键词就会被忽略。可用 app: / title: / msg: 前缀限定字段。",
+        "en": "Block keywords: if notification contains any of these, it will be ignored. Prefix with app: / title: / msg: to match one field only.",
+        "ja": "ブロック語句：通知に含まれる場合は無視されます。app: / title: / msg: を付けると該当フィールドのみ対象。",
     },
     "case_insensitive": {"zh": "忽略大小写", "en": "Case-insensitive match", "ja": "大文字小文字を無視"},
 
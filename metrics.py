@@ -0,0 +1,203 @@
+# metrics.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+LabelValues = Tuple[str, ...]
+GaugeValue = Union[float, Dict[LabelValues, float]]
+
+# seconds; covers a BLE round trip (ms) up to an outbox replay after an outage (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}  # per-bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for key, row in items:
+            acc = 0.0
+            for b, n in zip(self.buckets, row):
+                acc += n
+                le = 'le="%s"' % _num(b)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_num(acc)}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_num(row[-1])}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(row[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {_num(row[-1])}")
+        return out
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback: a number, or {label values: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def _samples(self) -> List[str]:
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        if isinstance(v, dict):
+            return [f"{self.name}{_labels(self.labelnames, k)} {_num(x)}" for k, x in v.items()]
+        return [f"{self.name} {_num(v)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+class BridgeMetrics:
+    """The bridge's counters and histograms; gauges are attached by BridgeManager."""
+
+    def __init__(self):
+        self.registry = Registry()
+        r = self.registry
+        self.received = r.add(Counter(
+            "nekolink_notifications_received_total", "Notifications parsed from the Data Source.", ["device"]))
+        self.deduplicated = r.add(Counter(
+            "nekolink_notifications_deduplicated_total", "Notifications dropped as duplicates.", ["device"]))
+        self.blocked = r.add(Counter(
+            "nekolink_notifications_blocked_total", "Notifications dropped by block keywords.", ["device"]))
+        self.forwarded = r.add(Counter(
+            "nekolink_notifications_forwarded_total", "Notifications handed to a destination.", ["dest"]))
+        self.deliveries = r.add(Counter(
+            "nekolink_deliveries_total", "Delivery steps by outcome.", ["dest", "result"]))
+        self.reconnects = r.add(Counter(
+            "nekolink_reconnects_total", "BLE reconnects after a lost link.", ["device"]))
+        self.cp_rtt = r.add(Histogram(
+            "nekolink_cp_roundtrip_seconds", "Control Point write to complete Data Source response.", ["device"]))
+        self.delivery_latency = r.add(Histogram(
+            "nekolink_delivery_latency_seconds", "Data Source completion to successful delivery.", ["dest"]))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()):
+        self.registry.add(Gauge(name, help_text, fn, labelnames))
+
+
+class MetricsServer:
+    """GET /metrics in Prometheus text format on a background thread."""
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9465):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        reg = registry
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = reg.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        self.host, self.port = host, int(port)
+        self._server = ThreadingHTTPServer((host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="nekolink-metrics", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
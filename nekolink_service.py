@@ -0,0 +1,137 @@
+# nekolink_service.py
+# -*- coding: utf-8 -*-
+"""
+Headless NekoLink: the bridge without the window, tray or theme.
+
+    python nekolink_service.py [--config PATH] [--log-file PATH] [--quiet]
+
+Reads the same config.json as the GUI (get_config_path / load_config), starts
+every configured device and forwards until SIGINT / SIGTERM (Ctrl+Break on
+Windows), then flushes pending deliveries and exits. SIGHUP re-reads the
+config where the platform has it: new devices start, removed ones stop.
+"""
+from __future__ import annotations
+
+import time
+
+_T0 = time.perf_counter()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import signal  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+from typing import List, Optional, TextIO  # noqa: E402
+
+from ancs_bridge import BridgeManager, _app_label, get_config_path, load_config  # noqa: E402
+
+
+class _LineLog:
+    """Timestamped lines to stdout and/or a file, safe to call from any thread."""
+
+    def __init__(self, path: Optional[str], to_stdout: bool = True):
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+        self._stdout = to_stdout
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def __call__(self, s: str):
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {s}"
+        with self._lock:
+            if self._stdout:
+                try:
+                    print(line, flush=True)
+                except Exception:
+                    pass
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Run the NekoLink bridge without the GUI.")
+    ap.add_argument("--config", help="config.json to use (default: same lookup as the GUI)")
+    ap.add_argument("--log-file", help="append log lines to this file")
+    ap.add_argument("--quiet", action="store_true", help="no log output on stdout")
+    args = ap.parse_args(argv)
+
+    log = _LineLog(args.log_file, to_stdout=not args.quiet)
+    config_path = args.config or get_config_path()
+    cfg = load_config(config_path)
+    if not cfg.ble_addresses:
+        log(f"[SERVICE] no ble_addresses in {config_path}")
+        log.close()
+        return 2
+
+    def on_notification(payload: dict):
+        codes = " ".join(payload.get("codes") or [])
+        log(f"[{payload.get('device')}] {_app_label(payload)} | {payload.get('title') or ''}"
+            + (f" | codes: {codes}" if codes else ""))
+
+    stop = threading.Event()
+    reload_cfg = threading.Event()
+    wake = threading.Event()
+
+    stopped_by: List[int] = []
+
+    # handlers only set events: they run between bytecodes of the main thread,
+    # which may be holding the log lock at that moment
+    def on_stop(signum, _frame):
+        stopped_by.append(signum)
+        stop.set()
+        wake.set()
+
+    def on_reload(_signum, _frame):
+        reload_cfg.set()
+        wake.set()
+
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), on_stop)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, on_reload)
+
+    manager = BridgeManager(cfg, log, on_notification)
+    manager.start_all(cfg.ble_addresses)
+    log(f"[SERVICE] {len(cfg.ble_addresses)} device(s) starting, config {config_path}, "
+        f"up in {(time.perf_counter() - _T0) * 1000:.0f} ms")
+
+    try:
+        while not stop.is_set():
+            # a timed wait keeps the main thread responsive to signals on Windows
+            wake.wait(1.0)
+            wake.clear()
+            if stop.is_set() or not reload_cfg.is_set():
+                continue
+            reload_cfg.clear()
+            old = {a.strip() for a in cfg.ble_addresses}
+            try:
+                new_cfg = load_config(config_path, strict=True)
+            except Exception as e:
+                log(f"[SERVICE] reload failed, keeping the current config: {type(e).__name__}: {e}")
+                continue
+            manager.cfg = cfg = new_cfg
+            removed = sorted(old - {a.strip() for a in cfg.ble_addresses})
+            if removed:
+                manager.stop_all(removed)
+            manager.start_all(cfg.ble_addresses)
+            log(f"[SERVICE] config reloaded from {config_path}"
+                + (f", stopped {', '.join(removed)}" if removed else ""))
+    finally:
+        if stopped_by:
+            log(f"[SERVICE] signal {stopped_by[0]}, stopping")
+        manager.shutdown(timeout=5.0)
+        log("[SERVICE] stopped")
+        log.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
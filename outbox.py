@@ -0,0 +1,151 @@
+# outbox.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Set, Tuple
+
+# how long the writer waits to gather more changes into one transaction
+_COMMIT_INTERVAL = 0.05
+
+
+class Outbox:
+    """
+    Crash-safe list of deliveries that have not been confirmed yet (SQLite, WAL).
+
+    put() and done() only queue the change; a writer thread commits everything
+    queued since the last commit in one transaction, so a burst costs one fsync
+    instead of one per message. A put() and done() for the same row that land
+    in the same batch cancel out and never touch the disk.
+    """
+
+    def __init__(self, path: str, log: Callable[[str], None], max_age_seconds: float = 24 * 3600):
+        self.path = path
+        self.log = log
+        self.max_age_seconds = float(max_age_seconds)
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY,"
+            " dest TEXT NOT NULL,"
+            " spec TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._db_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        row = self._db.execute("SELECT MAX(id) FROM outbox").fetchone()
+        self._next_id = int(row[0] or 0) + 1
+
+        self._puts: List[Tuple[int, str, str, float]] = []
+        self._dones: Set[int] = set()
+        self._cv = threading.Condition()
+        self._closing = False
+
+        self._writer = threading.Thread(target=self._run, name="nekolink-outbox", daemon=True)
+        self._writer.start()
+
+    # ---------- queueing ----------
+    def put(self, dest: str, spec: dict) -> int:
+        with self._cv:
+            oid = self._next_id
+            self._next_id += 1
+            self._puts.append((oid, dest, json.dumps(spec, ensure_ascii=False), time.time()))
+            self._cv.notify()
+            return oid
+
+    def done(self, oid: int):
+        with self._cv:
+            self._dones.add(oid)
+            self._cv.notify()
+
+    # ---------- writer ----------
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._puts and not self._dones and not self._closing:
+                    self._cv.wait()
+                if self._closing and not self._puts and not self._dones:
+                    return
+            # let the rest of a burst arrive, then commit it as a group
+            time.sleep(_COMMIT_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        # one flush at a time, so a done() can never be committed before its put()
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._cv:
+            puts, self._puts = self._puts, []
+            dones, self._dones = self._dones, set()
+        if not puts and not dones:
+            return
+        new_ids = {p[0] for p in puts}
+        puts = [p for p in puts if p[0] not in dones]
+        dones = dones - new_ids
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                if puts:
+                    self._db.executemany("INSERT OR REPLACE INTO outbox (id, dest, spec, created) VALUES (?, ?, ?, ?)", puts)
+                if dones:
+                    self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in dones])
+                self._db.execute("COMMIT")
+        except Exception as e:
+            self.log(f"[OUTBOX] commit error: {e}")
+            try:
+                with self._db_lock:
+                    self._db.execute("ROLLBACK")
+            except Exception:
+                pass
+            # keep the changes for the next attempt
+            with self._cv:
+                self._puts[:0] = puts
+                self._dones |= dones
+
+    # ---------- reading ----------
+    def pending(self, exclude: Optional[Set[int]] = None) -> List[Tuple[int, str, dict]]:
+        """Unconfirmed deliveries in arrival order; drops rows older than max_age_seconds."""
+        self.flush()
+        cutoff = time.time() - self.max_age_seconds
+        with self._db_lock:
+            expired = self._db.execute("DELETE FROM outbox WHERE created < ?", (cutoff,)).rowcount
+            rows = self._db.execute("SELECT id, dest, spec FROM outbox ORDER BY id").fetchall()
+        if expired:
+            self.log(f"[OUTBOX] discarded {expired} expired deliveries")
+        out: List[Tuple[int, str, dict]] = []
+        for oid, dest, spec in rows:
+            if exclude and oid in exclude:
+                continue
+            try:
+                out.append((oid, dest, json.loads(spec)))
+            except Exception:
+                self.done(oid)
+        return out
+
+    def depth(self) -> int:
+        with self._cv:
+            queued = len(self._puts) - len(self._dones)
+        with self._db_lock:
+            row = self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()
+        return max(0, int(row[0] or 0) + queued)
+
+    def close(self):
+        with self._cv:
+            self._closing = True
+            self._cv.notify()
+        self._writer.join(timeout=2.0)
+        self.flush()
+        try:
+            with self._db_lock:
+                self._db.close()
+        except Exception:
+            pass
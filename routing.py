@@ -0,0 +1,133 @@
+# routing.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from blocker import KeywordBlocker
+
+DESTINATIONS = ("toast", "telegram", "dingtalk", "gotify", "email")
+
+# (device, app, app name) keys remembered in the dispatch table before it is reset
+_TABLE_LIMIT = 4096
+
+
+@dataclass
+class _Rule:
+    index: int
+    device: str  # "" = any
+    app: str  # "" = any; "prefix*" allowed
+    app_name: str  # display name, exact; "" = any
+    keywords: Optional[KeywordBlocker]
+    has_code: Optional[bool]
+    to: FrozenSet[str]
+
+    def matches_source(self, device: str, app: str, app_name: str) -> bool:
+        if self.device and self.device != device:
+            return False
+        if self.app_name and self.app_name != app_name:
+            return False
+        if self.app:
+            if self.app.endswith("*"):
+                return app.startswith(self.app[:-1])
+            return self.app == app
+        return True
+
+    @property
+    def content_free(self) -> bool:
+        return self.keywords is None and self.has_code is None
+
+    def matches_content(self, payload: dict) -> bool:
+        if self.has_code is not None and bool(payload.get("codes")) != self.has_code:
+            return False
+        if self.keywords is not None:
+            app = "\n".join(x for x in (payload.get("app"), payload.get("app_name")) if x)
+            if not self.keywords.is_blocked(app, payload.get("title") or "", payload.get("msg") or ""):
+                return False
+        return True
+
+
+class Router:
+    """
+    Maps a notification to the set of destinations it goes to.
+
+    Rules (BridgeConfig.routes) are checked in order and the first match wins:
+
+        {"device": "62:56:29:71:36:67", "app": "com.icbc.*",
+         "keyword": ["余额", "title:转账"], "has_code": true,
+         "to": ["telegram", "email"]}
+        {"app_name": "微信", "to": ["gotify"]}
+
+    Every condition is optional. Device/app conditions are resolved once per
+    (device, app, display name) into a cached dispatch entry; if the first applicable
+    rule has no keyword/code condition the entry is the final answer, so the
+    common case is a single dict lookup. Notifications no rule matches go to
+    every enabled destination (route() returns None).
+    """
+
+    def __init__(self, rules: Optional[List[dict]] = None, log: Optional[Callable[[str], None]] = None):
+        self.rules: List[_Rule] = []
+        for i, r in enumerate(rules or []):
+            try:
+                kws = r.get("keyword") or r.get("keywords") or []
+                if isinstance(kws, str):
+                    kws = [kws]
+                to = frozenset(str(d).strip().lower() for d in (r.get("to") or []))
+                unknown = to.difference(DESTINATIONS)
+                if unknown and log:
+                    log(f"[ROUTE] rule {i}: unknown destinations {sorted(unknown)}")
+                has_code = r.get("has_code")
+                self.rules.append(_Rule(
+                    index=i,
+                    device=str(r.get("device") or "").strip().upper(),
+                    app=str(r.get("app") or "").strip(),
+                    app_name=str(r.get("app_name") or "").strip(),
+                    keywords=KeywordBlocker(kws, True) if kws else None,
+                    has_code=None if has_code is None else bool(has_code),
+                    to=to & frozenset(DESTINATIONS),
+                ))
+            except Exception as e:
+                if log:
+                    log(f"[ROUTE] rule {i} ignored: {e}")
+        # (device, app, app name) -> fixed result, or the rules still to check against content
+        self._table: Dict[Tuple[str, str, str], object] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def _entry(self, device: str, app: str, app_name: str):
+        key = (device, app, app_name)
+        entry = self._table.get(key)
+        if entry is not None:
+            return entry
+        candidates: List[_Rule] = []
+        for rule in self.rules:
+            if not rule.matches_source(device, app, app_name):
+                continue
+            candidates.append(rule)
+            if rule.content_free:
+                break  # later rules can never be reached
+        if candidates and candidates[0].content_free:
+            entry = ("fixed", candidates[0].to)
+        elif not candidates:
+            entry = ("fixed", None)
+        else:
+            entry = ("check", tuple(candidates))
+        if len(self._table) >= _TABLE_LIMIT:
+            self._table.clear()
+        self._table[key] = entry
+        return entry
+
+    def route(self, payload: dict) -> Optional[FrozenSet[str]]:
+        if not self.rules:
+            return None
+        kind, value = self._entry(
+            str(payload.get("device") or "").upper(), payload.get("app") or "", payload.get("app_name") or ""
+        )
+        if kind == "fixed":
+            return value
+        for rule in value:
+            if rule.matches_content(payload):
+                return rule.to
+        return None
@@ -0,0 +1,139 @@
+# smtp_session.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import re
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+# NOOP before reusing a connection that has been idle this long
+_PROBE_AFTER = 30.0
+
+
+def split_recipients(s: str) -> List[str]:
+    return [a.strip() for a in re.split(r"[,;\s]+", s or "") if a.strip()]
+
+
+class SmtpSession:
+    """
+    One authenticated SMTP connection kept open across messages.
+
+    EHLO/STARTTLS/LOGIN happen once; a connection idle for a while is probed
+    with NOOP before use, and a dropped connection is re-established and the
+    send retried once.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used: float = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self, timeout: float) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=timeout)
+        try:
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+            server.login(self.user, self.password)
+        except Exception:
+            _quit_quietly(server)
+            raise
+        return server
+
+    def _alive(self) -> bool:
+        if self._server is None:
+            return False
+        if time.time() - self._last_used < _PROBE_AFTER:
+            return True
+        try:
+            code, _ = self._server.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def _ensure(self, timeout: float) -> smtplib.SMTP:
+        if not self._alive():
+            self._drop()
+            self._server = self._connect(timeout)
+        server = self._server
+        if server.sock is not None:
+            server.sock.settimeout(timeout)
+        return server
+
+    def _drop(self):
+        server, self._server = self._server, None
+        if server is not None:
+            _quit_quietly(server)
+
+    def send(self, msg: Message, from_addr: str, to_addrs: List[str], timeout: float = 10):
+        """Send one message to all recipients in a single transaction."""
+        with self._lock:
+            for attempt in (0, 1):
+                server = self._ensure(timeout)
+                try:
+                    server.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+                    self._last_used = time.time()
+                    return
+                except OSError as e:
+                    # 421 / reset / broken pipe: reconnect once, then give up
+                    if not _is_connection_error(e):
+                        raise
+                    self._drop()
+                    if attempt == 1:
+                        raise
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+
+class SmtpSessions:
+    def __init__(self):
+        self._sessions: Dict[Tuple[str, int, str, str], SmtpSession] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str, port: int, user: str, password: str) -> SmtpSession:
+        key = (host, int(port), user, password)
+        with self._lock:
+            s = self._sessions.get(key)
+            if s is None:
+                s = SmtpSession(host, port, user, password)
+                self._sessions[key] = s
+            return s
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for s in sessions:
+            s.close()
+
+
+def _is_connection_error(e: OSError) -> bool:
+    # smtplib.SMTPException is itself an OSError; only transport-level failures count
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code == 421
+    return not isinstance(e, smtplib.SMTPException)
+
+
+def _quit_quietly(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+SESSIONS = SmtpSessions()
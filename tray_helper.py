@@ -2,8 +2,6 @@
 # -*- coding: utf-8 -*-
 import threading
 import os
-from PIL import Image
-import pystray
 
 
 class TrayController:
@@ -39,6 +37,9 @@ class TrayController:
     # ----------------------------
 
     def _run(self):
+        # PIL and pystray load here, on the tray thread, not before the window paints
+        import pystray
+
         image = self._load_icon()
 
         menu = pystray.Menu(
@@ -69,6 +70,8 @@ class TrayController:
             icon.stop()
 
     def _load_icon(self):
+        from PIL import Image
+
         if self.icon_path and os.path.exists(self.icon_path):
             try:
                 return Image.open(self.icon_path)